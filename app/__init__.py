@@ -3,14 +3,24 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
-from config import Config
-import psycopg2
+from config import Config, config
+from app.hashing import PasswordHasher
+from app.mailer import MailQueue
+from app.ratelimit import RateLimiter
+from app.audit import AuditLog
+from app.routing import RoutingSession
+import os
+import time
 from sqlalchemy_utils import database_exists, create_database
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 mail = Mail()
+hasher = PasswordHasher()
+mail_queue = MailQueue()
+limiter = RateLimiter()
+audit_log = AuditLog()
 
 def setup_database(app):
     db_url = app.config['SQLALCHEMY_DATABASE_URI']
@@ -21,45 +31,66 @@ def setup_database(app):
         create_database(db_url)
         print(f"Database '{db_name}' created.")
 
-    # Connect to the database
-    conn = psycopg2.connect(db_url)
-    conn.autocommit = False
-    cursor = conn.cursor()
-
-    try:
-        # Check if the 'user' table exists
-        cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'user')")
-        table_exists = cursor.fetchone()[0]
-
-        if not table_exists:
-            print("Creating 'user' table...")
-            db.create_all()
-            print("'user' table created.")
-        else:
-            print("'user' table already exists.")
-
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        print(f"An error occurred: {e}")
-    finally:
-        cursor.close()
-        conn.close()
-
-def create_app(config_class=Config):
+    # Creates only the tables that are missing
+    if not db.inspect(db.engine).has_table('user'):
+        print("Creating tables...")
+    db.create_all()
+
+def create_app(config_class=None):
+    started = time.perf_counter()
+    if config_class is None:
+        config_name = os.environ.get('APP_CONFIG')
+        config_class = config[config_name] if config_name else Config
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    from .serializers import init_json
+    init_json(app)
+
+    from .dbpool import init_pool_stats
+    init_pool_stats(app)
     db.init_app(app)
     migrate.init_app(app, db)
-    
-    with app.app_context():
-        setup_database(app)
-    
+
+    # Schema management is an explicit step (`init_db` or `flask db upgrade`)
+    # in production, so creating an app does no database I/O
+    if app.config['AUTO_CREATE_DATABASE']:
+        with app.app_context():
+            setup_database(app)
+
     jwt.init_app(app)
     mail.init_app(app)
+    hasher.init_app(app)
+    mail_queue.init_app(app)
+    limiter.init_app(app)
+    audit_log.init_app(app)
+
+    from .routing import init_routing
+    init_routing(app)
+
+    from .identity import init_identity
+    init_identity(app)
+
+    from .revocation import init_blocklist
+    init_blocklist(app)
+
+    from .validation import init_validation
+    init_validation(app)
+
+    from .metrics import init_metrics
+    init_metrics(app)
 
     from .api import api_bp
     app.register_blueprint(api_bp)
 
+    @app.shell_context_processor
+    def make_shell_context():
+        from .models import User
+        return {'db': db, 'User': User}
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    app.extensions['startup_time_ms'] = elapsed_ms
+    if elapsed_ms > app.config['STARTUP_TIME_BUDGET_MS']:
+        app.logger.warning('create_app took %.1f ms (budget %d ms)', elapsed_ms, app.config['STARTUP_TIME_BUDGET_MS'])
+
     return app
\ No newline at end of file
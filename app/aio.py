@@ -0,0 +1,297 @@
+"""Native async handlers for the hottest endpoints in ASGI mode.
+
+``POST /auth/login`` and ``GET /users/{id}`` run as coroutines on the event
+loop with an ``AsyncSession`` (asyncpg on PostgreSQL, aiosqlite on SQLite).
+While they wait on the database they hold no thread, and all of a process's
+requests share one small async connection pool. Password checks are sent to
+the hashing process pool with ``run_in_executor``.
+
+The fast path only answers the common cases itself. Anything else is passed
+unchanged to the Flask app on a2wsgi's thread pool: errors, tokens the
+in-memory blocklist cannot clear, every other route and the OpenAPI spec. So
+the responses are the same in both modes.
+"""
+import asyncio
+import json
+import re
+import time
+from functools import partial
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token
+from sqlalchemy import select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from werkzeug.http import http_date, is_resource_modified, parse_cookie
+from app import audit_log, hasher, limiter
+from app.api.auth import login_validator
+from app.api.users import user_columns, user_model, user_serializer
+from app.conditional import user_etag
+from app.hashing import HashingBusy
+from app.identity import claims_cache, token_claims
+from app.metrics import REQUEST_LATENCY
+from app.models import User
+from app.ratelimit import MemoryStore, RateLimited
+from app.revocation import token_blocklist
+from app.routing import router, sticky_identity
+from app.serializers import dumps_bytes
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_database_url(url):
+    """``url`` with its driver swapped for the async one (asyncpg or aiosqlite)."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver configured for {backend} databases')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def create_engine_for(url, options):
+    url = async_database_url(url)
+    options = dict(options)
+    if options.get('poolclass') is not NullPool:
+        # The instrumented QueuePool is sync only (and aiosqlite would default to no pool)
+        options['poolclass'] = AsyncAdaptedQueuePool
+    elif url.get_backend_name() == 'postgresql':
+        # pgbouncer in transaction mode: no prepared statements survive a transaction
+        url = url.update_query_dict({'prepared_statement_cache_size': '0'})
+        options['connect_args'] = {'statement_cache_size': 0}
+    return create_async_engine(url, **options)
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.body = body
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        self.remote_addr = scope['client'][0] if scope.get('client') else None
+
+    def json(self):
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+def json_body(status, data, headers=()):
+    return status, dumps_bytes(data), [('Content-Type', 'application/json'), *headers]
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def replay(body):
+    """An ASGI ``receive`` that hands the already-read ``body`` to the fallback app."""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {'type': 'http.disconnect'}
+        sent = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    return receive
+
+
+class AsyncAPI:
+    """ASGI app serving the fast-path routes natively and the rest through ``fallback``."""
+
+    def __init__(self, app, fallback):
+        self.app = app
+        self.fallback = fallback
+        self.routes = [
+            ('POST', re.compile(r'/auth/login'), 'api.auth_login', self.login),
+            ('GET', re.compile(r'/users/(\d+)'), 'api.users_user_resource', self.get_user),
+        ]
+        self._primary = None
+        self._replicas = []
+        self._sessions = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http':
+            for method, pattern, endpoint, handler in self.routes:
+                match = pattern.fullmatch(scope['path'])
+                if match and scope['method'] == method:
+                    return await self.dispatch(scope, receive, send, endpoint, handler, match.groups())
+        await self.fallback(scope, receive, send)
+
+    async def dispatch(self, scope, receive, send, endpoint, handler, args):
+        start = time.perf_counter()
+        body = await read_body(receive)
+        with self.app.app_context():
+            result = await handler(Request(scope, body), *args)
+        if result is None:
+            return await self.fallback(scope, replay(body), send)
+        status, content, headers = result
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.encode('latin-1'), value.encode('latin-1'))
+                        for name, value in [*headers, ('Content-Length', str(len(content)))]],
+        })
+        await send({'type': 'http.response.body', 'body': content})
+        if self.app.config['METRICS_ENABLED']:
+            REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint, scope['method'], status)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _session(self, engine):
+        if engine not in self._sessions:
+            self._sessions[engine] = async_sessionmaker(engine, expire_on_commit=False)
+        return self._sessions[engine]()
+
+    def primary(self):
+        if self._primary is None:
+            config = self.app.config
+            options = config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+            self._primary = create_engine_for(config['ASYNC_DATABASE_URL'] or config['SQLALCHEMY_DATABASE_URI'],
+                                              options)
+            self._replicas = [create_engine_for(url, options) for key, url in config['SQLALCHEMY_BINDS'].items()
+                              if key.startswith('replica_')]
+        return self._primary
+
+    def reader(self, identity, request):
+        """A replica engine for ``identity``, or the primary after their recent write."""
+        primary = self.primary()
+        if not self._replicas or router.wrote_recently(identity):
+            return primary
+        cookie = parse_cookie(request.headers.get('cookie', '')).get(self.app.config['DB_REPLICA_STICKY_COOKIE'])
+        if cookie and sticky_identity(cookie) == identity:
+            return primary
+        return router.choose(self._replicas, self.app.config['DB_REPLICA_SELECTION'])
+
+    async def dispose(self):
+        for engine in [self._primary, *self._replicas]:
+            if engine is not None:
+                await engine.dispose()
+        self._primary, self._replicas, self._sessions = None, [], {}
+
+    async def rate_limit(self, scope, **values):
+        if isinstance(limiter.store, MemoryStore):
+            limiter.check(scope, **values)
+        else:
+            # Shared stores are network round trips; keep them off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, partial(limiter.check, scope, **values))
+
+    async def login(self, request):
+        payload = request.json()
+        if payload is None:
+            return None
+        data, errors = login_validator.check(payload)
+        if errors:
+            return None
+        try:
+            # Throttle before any database or password hashing work
+            await self.rate_limit('login', ip=request.remote_addr, username=data['username'].lower())
+        except RateLimited as e:
+            return json_body(429, {'message': 'Too many attempts, please retry later'},
+                             [('Retry-After', str(e.retry_after))])
+
+        async with self._session(self.primary()) as session:
+            user = (await session.execute(
+                select(User.id, User.password_hash, User.role, User.is_active, User.token_version)
+                .filter_by(username=data['username'])
+            )).first()
+            try:
+                valid = user is not None and await hasher.verify_async(user.password_hash, data['password'])
+                if valid and hasher.needs_rehash(user.password_hash):
+                    password_hash = await hasher.hash_async(data['password'])
+                    await session.execute(update(User).where(User.id == user.id).values(password_hash=password_hash))
+                    await session.commit()
+            except HashingBusy as e:
+                return json_body(503, {'message': 'Server is busy, please retry shortly'},
+                                 [('Retry-After', str(e.retry_after))])
+
+        if not valid:
+            audit_log.record('login_failed', target_id=user.id if user else None, ip=request.remote_addr,
+                             username=data['username'])
+            return json_body(401, {'message': 'Invalid credentials'})
+        claims = token_claims(user)
+        access_token = create_access_token(identity=user.id, additional_claims=claims)
+        refresh_token = create_refresh_token(identity=user.id, additional_claims=claims)
+        audit_log.record('login', actor_id=user.id, target_id=user.id, ip=request.remote_addr)
+        return json_body(200, {'access_token': access_token, 'refresh_token': refresh_token})
+
+    def access_claims(self, request):
+        """The verified access token claims, or None to leave the request to Flask."""
+        config = self.app.config
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        if scheme != config['JWT_HEADER_TYPE'] or not token:
+            return None
+        try:
+            claims = decode_token(token)
+        except Exception:
+            return None
+        if claims.get('type') != 'access' or 'ver' not in claims:
+            return None
+        if not token_blocklist.is_known_clear(claims['jti']):
+            return None
+        return claims
+
+    async def user_claims(self, identity):
+        """Current role, active flag and token version, as ``identity.lookup_claims`` returns them."""
+        use_cache = self.app.config['AUTH_CLAIMS_CACHE_ENABLED']
+        claims = claims_cache.get(identity) if use_cache else None
+        if claims is None:
+            async with self._session(self.primary()) as session:
+                row = (await session.execute(
+                    select(User.role, User.is_active, User.token_version).filter_by(id=identity)
+                )).first()
+            if row is None:
+                return None
+            claims = {'id': identity, 'role': row.role, 'is_active': row.is_active,
+                      'token_version': row.token_version or 0}
+            if use_cache:
+                claims_cache.set(identity, claims)
+        return claims
+
+    async def get_user(self, request, id):
+        id = int(id)
+        token = self.access_claims(request)
+        if token is None or not token['active']:
+            return None
+        subject = token[self.app.config['JWT_IDENTITY_CLAIM']]
+        identity = int(subject)
+        if token['role'] != 'Admin' and identity != id:
+            return None
+        user = await self.user_claims(identity)
+        if user is None or user['token_version'] != token['ver']:
+            return None
+
+        serialize = user_serializer(tuple(user_model))
+        async with self._session(self.reader(subject, request)) as session:
+            row = (await session.execute(select(*user_columns(serialize.names)).where(User.id == id))).first()
+        if row is None:
+            return None
+        updated_at = row._mapping['updated_at']
+        etag = user_etag(id, updated_at)
+        headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'private, no-cache')]
+        if updated_at is not None:
+            headers.append(('Last-Modified', http_date(updated_at)))
+        conditions = {f'HTTP_{name.upper().replace("-", "_")}': request.headers[name]
+                      for name in ('if-none-match', 'if-modified-since') if name in request.headers}
+        if not is_resource_modified(conditions, etag=etag, last_modified=updated_at):
+            return 304, b'', headers
+        return json_body(200, serialize(row), headers)
@@ -1,8 +1,15 @@
-from flask import Blueprint
-from flask_restx import Api
+from flask import Blueprint, Flask, current_app, make_response
 from .auth import api as auth_ns
 from .users import api as users_ns
+from .system import api as system_ns
+from .audit import api as audit_ns
 from flask_jwt_extended import JWTManager
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+from app.hashing import HashingBusy
+from app.ratelimit import RateLimited
+from app.serializers import dumps_bytes
+from .spec import CachedSpecApi
 
 authorizations = {
     'Bearer Auth': {
@@ -13,7 +20,7 @@ authorizations = {
 }
 
 api_bp = Blueprint('api', __name__)
-api = Api(api_bp,
+api = CachedSpecApi(api_bp,
     title='User Management API',
     version='1.0',
     description='A simple user management API with Role-based access control',
@@ -22,5 +29,31 @@ api = Api(api_bp,
     security='Bearer Auth'
 )
 
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    response = make_response(dumps_bytes(data), code)
+    response.headers.extend(headers or {})
+    return response
+
 api.add_namespace(auth_ns)
-api.add_namespace(users_ns)
\ No newline at end of file
+api.add_namespace(users_ns)
+api.add_namespace(system_ns)
+api.add_namespace(audit_ns)
+
+@api.errorhandler(HashingBusy)
+def handle_hashing_busy(error):
+    return {'message': 'Server is busy, please retry shortly'}, 503, {'Retry-After': str(error.retry_after)}
+
+@api.errorhandler(RateLimited)
+def handle_rate_limited(error):
+    return {'message': 'Too many attempts, please retry later'}, 429, {'Retry-After': str(error.retry_after)}
+
+@api.errorhandler(JWTExtendedException)
+@api.errorhandler(PyJWTError)
+def handle_jwt_error(error):
+    # Restx catches these before the app handlers JWTManager registers, which
+    # otherwise only run when exceptions propagate (DEBUG). Restx also wraps
+    # app.handle_user_exception, so Flask's own is called to reach them.
+    app = current_app._get_current_object()
+    response = app.make_response(Flask.handle_user_exception(app, error))
+    return response.get_json(), response.status_code
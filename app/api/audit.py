@@ -0,0 +1,66 @@
+from flask import current_app, request, url_for
+from flask_restx import Namespace, Resource, fields, inputs
+from app import db
+from app.models import AuditEvent
+from app.identity import claims_required
+from app.pagination import encode_cursor, decode_cursor, clamp_limit, link_header
+
+api = Namespace('audit', description='Audit trail of account changes', security='Bearer')
+
+audit_event_model = api.model('AuditEvent', {
+    'id': fields.Integer,
+    'created_at': fields.DateTime,
+    'action': fields.String,
+    'actor_id': fields.Integer,
+    'target_id': fields.Integer,
+    'ip': fields.String,
+    'details': fields.Raw
+})
+
+audit_parser = api.parser()
+audit_parser.add_argument('action', type=str, location='args', help='Only events of this action, e.g. login_failed')
+audit_parser.add_argument('actor_id', type=int, location='args', help='Only events performed by this user')
+audit_parser.add_argument('target_id', type=int, location='args', help='Only events affecting this user')
+audit_parser.add_argument('since', type=inputs.datetime_from_iso8601, location='args', help='At or after this time')
+audit_parser.add_argument('until', type=inputs.datetime_from_iso8601, location='args', help='Before this time')
+audit_parser.add_argument('limit', type=int, location='args', help='Page size')
+audit_parser.add_argument('cursor', type=str, location='args', help='Opaque cursor from a previous page')
+
+@api.route('/')
+class AuditEventList(Resource):
+    @api.expect(audit_parser)
+    @api.marshal_list_with(audit_event_model)
+    @claims_required(admin=True)
+    @api.doc(security='Bearer Auth')
+    def get(self):
+        args = audit_parser.parse_args()
+        try:
+            limit = clamp_limit(args['limit'],
+                                current_app.config['AUDIT_PAGE_DEFAULT_LIMIT'],
+                                current_app.config['AUDIT_PAGE_MAX_LIMIT'])
+            before = decode_cursor(args['cursor'], [int])[0] if args['cursor'] else None
+        except ValueError as e:
+            api.abort(400, str(e))
+
+        # Newest first, keyset on id; each filter has an (x, id) index
+        query = db.select(AuditEvent).order_by(AuditEvent.id.desc())
+        for name in ('action', 'actor_id', 'target_id'):
+            if args[name] is not None:
+                query = query.filter(getattr(AuditEvent, name) == args[name])
+        if args['since']:
+            query = query.filter(AuditEvent.created_at >= args['since'])
+        if args['until']:
+            query = query.filter(AuditEvent.created_at < args['until'])
+        if before is not None:
+            query = query.filter(AuditEvent.id < before)
+        events = db.session.execute(query.limit(limit + 1)).scalars().all()
+
+        headers = {}
+        if len(events) > limit:
+            events = events[:limit]
+            next_cursor = encode_cursor([events[-1].id])
+            params = {k: v for k, v in request.args.items() if k != 'cursor'}
+            headers['X-Next-Cursor'] = next_cursor
+            headers['Link'] = link_header(url_for('api.audit_audit_event_list', **params, cursor=next_cursor,
+                                                  _external=True), 'next')
+        return events, 200, headers
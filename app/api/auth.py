@@ -1,89 +1,101 @@
 from flask_restx import Namespace, Resource, fields
 from flask import request, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-import re
-from app.models import User
-from app import db
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from flask_jwt_extended import (create_access_token, create_refresh_token, decode_token, get_jwt, jwt_required,
+                                current_user)
+from jwt.exceptions import ExpiredSignatureError, PyJWTError
+from app.models import User, PasswordResetToken
+from app import db, hasher, limiter, audit_log
 from app.utils import send_reset_email
+from app.identity import claims_required, token_claims, invalidate_user
+from app.revocation import revoke_tokens
+from app.validation import (PayloadValidator, check_email, check_password, check_password_length,
+                            check_username)
 
 api = Namespace('auth', description='Authentication operations', security='Bearer')
 
 register_model = api.model('Register', {
-    'username': fields.String(required=True),
+    'username': fields.String(required=True, max_length=64),
     'password': fields.String(required=True),
-    'email': fields.String(required=True),
-    'first_name': fields.String(required=True),
-    'last_name': fields.String(required=True)
+    'email': fields.String(required=True, max_length=120),
+    'first_name': fields.String(required=True, max_length=64),
+    'last_name': fields.String(required=True, max_length=64)
 })
 
 login_model = api.model('Login', {
-    'username': fields.String(required=True),
+    'username': fields.String(required=True, max_length=64),
     'password': fields.String(required=True)
 })
 
 forgot_password_model = api.model('ForgotPassword', {
-    'email': fields.String(required=True)
+    'email': fields.String(required=True, max_length=120)
 })
 
 reset_password_model = api.model('ResetPassword', {
-    'token': fields.String(required=True),
+    'token': fields.String(required=True, max_length=128),
     'new_password': fields.String(required=True)
 })
 
-def is_valid_email(email):
-    regex = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
-    return re.match(regex, email) is not None
-
-def is_valid_password(password):
-    if len(password) < 8:
-        return False
-    if not re.search(r'[0-9]', password):
-        return False
-    if not re.search(r'[A-Z]', password):
-        return False
-    if not re.search(r'[a-z]', password):
-        return False
-    if not re.search(r'[@$!%*?&#]', password):
-        return False
-    return True
-
-def is_valid_username(username):
-    regex = r'^[a-zA-Z0-9_.-]+$'
-    return re.match(regex, username) is not None
+logout_model = api.model('Logout', {
+    'refresh_token': fields.String(description='Refresh token to revoke along with the presented token')
+})
 
-@api.route('/register')
-class Register(Resource):
-    @api.expect(register_model)
-    def post(self):
-        data = request.json
+change_password_model = api.model('ChangePassword', {
+    'current_password': fields.String(required=True),
+    'new_password': fields.String(required=True)
+})
 
-        # Trim leading and trailing whitespace
-        for key in data:
-            data[key] = data[key].strip()
+register_validator = PayloadValidator(register_model, checks={
+    'username': check_username,
+    'email': check_email,
+    'password': check_password
+})
+login_validator = PayloadValidator(login_model, checks={'password': check_password_length})
+forgot_password_validator = PayloadValidator(forgot_password_model)
+reset_password_validator = PayloadValidator(reset_password_model, checks={'new_password': check_password})
+change_password_validator = PayloadValidator(change_password_model, checks={
+    'current_password': check_password_length,
+    'new_password': check_password
+})
 
-        # Check for missing fields
-        required_fields = ['username', 'password', 'email', 'first_name', 'last_name']
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return {'message': f'{field} is required and cannot be empty'}, 400
+# The unnamed unique constraints on user, as PostgreSQL names them
+UNIQUE_CONSTRAINT_MESSAGES = {
+    'user_username_key': 'Username already exists',
+    'user_email_key': 'Email already exists',
+}
 
-        # Check for unique username and email
-        if User.query.filter_by(username=data['username']).first():
-            return {'message': 'Username already exists'}, 400
-        if User.query.filter_by(email=data['email']).first():
-            return {'message': 'Email already exists'}, 400
+def duplicate_user_message(username, email, error=None, exclude_id=None):
+    """Which of username/email is taken, from a unique violation's constraint or one lookup.
 
-        # Validate email format
-        if not is_valid_email(data['email']):
-            return {'message': 'Invalid email address'}, 400
+    ``exclude_id`` is the user being updated, whose own unchanged values do not count.
+    """
+    diag = getattr(getattr(error, 'orig', None), 'diag', None)
+    constraint = getattr(diag, 'constraint_name', None)
+    if constraint in UNIQUE_CONSTRAINT_MESSAGES:
+        return UNIQUE_CONSTRAINT_MESSAGES[constraint]
+    # Other drivers only describe the violation in free text; ask the database instead
+    query = db.select(User.username, User.email).filter(or_(User.username == username, User.email == email))
+    if exclude_id is not None:
+        query = query.filter(User.id != exclude_id)
+    taken = db.session.execute(query.limit(2)).all()
+    if any(row.username == username for row in taken):
+        return 'Username already exists'
+    if taken:
+        return 'Email already exists'
+    return 'Username or email already exists' if error is not None else None
 
-        # Validate password strength
-        if not is_valid_password(data['password']):
-            return {'message': 'Password must be at least 8 characters long, contain numbers, uppercase and lowercase letters, and special characters'}, 400
+@api.route('/register')
+class Register(Resource):
+    @api.expect(register_model)
+    def post(self):
+        data = register_validator.validate()
 
-        # Validate username format
-        if not is_valid_username(data['username']):
-            return {'message': 'Username can only contain letters, numbers, underscores, hyphens, and periods'}, 400
+        # Check for unique username and email in a single round trip
+        error = duplicate_user_message(data['username'], data['email'])
+        if error:
+            return {'message': error}, 400
 
         # Create and save the user
         user = User(
@@ -96,83 +108,221 @@ class Register(Resource):
         try:
             db.session.add(user)
             db.session.commit()
+        except IntegrityError as e:
+            # Lost a race with a concurrent registration
+            db.session.rollback()
+            return {'message': duplicate_user_message(data['username'], data['email'], e)}, 400
         except Exception as e:
             db.session.rollback()
             return {'message': 'An error occurred while creating the user'}, 500
 
         return {'message': 'User created successfully'}, 201
 
+bulk_result_model = api.model('BulkRegisterResult', {
+    'index': fields.Integer,
+    'username': fields.String,
+    'status': fields.Integer,
+    'message': fields.String,
+    'id': fields.Integer
+})
+
+bulk_register_response_model = api.model('BulkRegisterResponse', {
+    'created': fields.Integer,
+    'failed': fields.Integer,
+    'results': fields.List(fields.Nested(bulk_result_model))
+})
+
+def insert_ignoring_conflicts(rows):
+    """Multi-row INSERT ... ON CONFLICT DO NOTHING; returns {username: id} of inserted rows."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        result = db.session.execute(db.insert(User).returning(User.id, User.username), rows)
+        return {row.username: row.id for row in result}
+
+    stmt = insert(User).on_conflict_do_nothing().returning(User.id, User.username)
+    inserted = {}
+    chunk_size = current_app.config['AUTH_BULK_REGISTER_CHUNK_SIZE']
+    for i in range(0, len(rows), chunk_size):
+        result = db.session.execute(stmt.values(rows[i:i + chunk_size]))
+        inserted.update({row.username: row.id for row in result})
+    return inserted
+
+@api.route('/register/bulk')
+class BulkRegister(Resource):
+    @api.expect([register_model])
+    @api.marshal_with(bulk_register_response_model)
+    @claims_required(admin=True)
+    @api.doc(security='Bearer Auth')
+    def post(self):
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            api.abort(400, 'Expected a JSON array of users')
+        if len(data) > current_app.config['AUTH_BULK_REGISTER_MAX_ITEMS']:
+            api.abort(413, f"At most {current_app.config['AUTH_BULK_REGISTER_MAX_ITEMS']} users per request")
+
+        results = []
+        valid = []
+        seen_usernames, seen_emails = set(), set()
+        for index, item in enumerate(data):
+            result = {'index': index, 'username': None, 'status': 400}
+            results.append(result)
+            item, errors = register_validator.check(item)
+            if errors:
+                result['username'] = item.get('username') if item else None
+                result['message'] = '; '.join(errors.values())
+                continue
+            result['username'] = item['username']
+            if item['username'] in seen_usernames:
+                result['message'] = 'Duplicate username in request'
+            elif item['email'] in seen_emails:
+                result['message'] = 'Duplicate email in request'
+            else:
+                seen_usernames.add(item['username'])
+                seen_emails.add(item['email'])
+                valid.append((result, item))
+
+        if valid:
+            hashes = hasher.hash_many([item['password'] for _, item in valid])
+            now = datetime.utcnow()
+            rows = [{
+                'username': item['username'],
+                'email': item['email'],
+                'first_name': item['first_name'],
+                'last_name': item['last_name'],
+                'password_hash': pwhash,
+                'role': 'User',
+                'is_active': True,
+                'created_at': now,
+                'updated_at': now
+            } for (_, item), pwhash in zip(valid, hashes)]
+
+            try:
+                inserted = insert_ignoring_conflicts(rows)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                api.abort(409, 'Username or email already exists')
+
+            for result, item in valid:
+                if item['username'] in inserted:
+                    result.update(status=201, message='User created successfully', id=inserted[item['username']])
+                else:
+                    result.update(status=409, message='Username or email already exists')
+
+        created = sum(1 for r in results if r['status'] == 201)
+        return {'created': created, 'failed': len(results) - created, 'results': results}, 200
+
 @api.route('/login')
 class Login(Resource):
     @api.expect(login_model)
     def post(self):
-        data = request.json
-
-        # Trim leading and trailing whitespace
-        data['username'] = data['username'].strip()
-        data['password'] = data['password'].strip()
-
-        # Check for missing or empty fields
-        if 'username' not in data or not data['username']:
-            return {'message': 'Username is required and cannot be empty'}, 400
-        if 'password' not in data or not data['password']:
-            return {'message': 'Password is required and cannot be empty'}, 400
+        data = login_validator.validate()
+        # Throttle before any database or password hashing work
+        limiter.check('login', ip=request.remote_addr, username=data['username'].lower())
 
         user = User.query.filter_by(username=data['username']).first()
         if user and user.check_password(data['password']):
-            access_token = create_access_token(identity=user.id)
-            return {'access_token': access_token}, 200
+            if hasher.needs_rehash(user.password_hash):
+                user.set_password(data['password'])
+                db.session.commit()
+            claims = token_claims(user)
+            access_token = create_access_token(identity=user.id, additional_claims=claims)
+            refresh_token = create_refresh_token(identity=user.id, additional_claims=claims)
+            audit_log.record('login', actor_id=user.id, target_id=user.id)
+            return {'access_token': access_token, 'refresh_token': refresh_token}, 200
+        audit_log.record('login_failed', target_id=user.id if user else None, username=data['username'])
         return {'message': 'Invalid credentials'}, 401
 
+@api.route('/refresh')
+class Refresh(Resource):
+    @jwt_required(refresh=True)
+    @api.doc(security='Bearer Auth')
+    def post(self):
+        # The token version was checked against the user on verification, so
+        # the role and status from the same lookup are current
+        if not current_user.is_active:
+            return {'message': 'Account is inactive'}, 403
+        claims = {'role': current_user.role, 'active': current_user.is_active, 'ver': get_jwt()['ver']}
+        return {'access_token': create_access_token(identity=current_user.id, additional_claims=claims)}, 200
+
+@api.route('/logout')
+class Logout(Resource):
+    @jwt_required(verify_type=False)
+    @api.expect(logout_model)
+    @api.doc(security='Bearer Auth')
+    def post(self):
+        tokens = [get_jwt()]
+        payload = request.get_json(silent=True)
+        refresh_token = payload.get('refresh_token') if isinstance(payload, dict) else None
+        if refresh_token:
+            try:
+                refresh = decode_token(refresh_token)
+            except ExpiredSignatureError:
+                refresh = None
+            except PyJWTError:
+                return {'message': 'Invalid refresh token'}, 400
+            if refresh is not None:
+                identity_claim = current_app.config['JWT_IDENTITY_CLAIM']
+                if refresh['type'] != 'refresh' or refresh[identity_claim] != tokens[0][identity_claim]:
+                    return {'message': 'Invalid refresh token'}, 400
+                tokens.append(refresh)
+
+        revoke_tokens(*tokens)
+        audit_log.record('logout', actor_id=current_user.id, target_id=current_user.id)
+        return {'message': 'Logged out successfully'}, 200
+
 @api.route('/forgot-password')
 class ForgotPassword(Resource):
     @api.expect(forgot_password_model)
     def post(self):
-        data = request.json
+        data = forgot_password_validator.validate()
+        limiter.check('forgot_password', ip=request.remote_addr, email=data['email'].lower())
         user = User.query.filter_by(email=data['email']).first()
         if not user:
             return {'message': 'If a user with this email exists, a password reset link has been sent.'}, 200
         
         token = user.generate_reset_token()
         send_reset_email(user.email, token)
+        db.session.commit()
         return {'message': 'If a user with this email exists, a password reset link has been sent.'}, 200
 
 @api.route('/reset-password')
 class ResetPassword(Resource):
     @api.expect(reset_password_model)
     def post(self):
-        data = request.json
-        user = User.query.filter_by(password_reset_token=data['token']).first()
-        if not user or not user.verify_reset_token(data['token']):
+        data = reset_password_validator.validate()
+        reset_token = PasswordResetToken.find_valid(data['token'])
+        if not reset_token:
             return {'message': 'Invalid or expired token'}, 400
-        
-        if not is_valid_password(data['new_password']):
-            return {'message': 'Password must be at least 8 characters long'}, 400
-        
+        user = reset_token.user
+
         user.set_password(data['new_password'])
+        user.revoke_tokens()
         user.clear_reset_token()
         db.session.commit()
+        invalidate_user(user.id)
+        audit_log.record('password_reset', actor_id=user.id, target_id=user.id)
         return {'message': 'Password has been reset successfully'}, 200
 
 @api.route('/change-password')
 class ChangePassword(Resource):
     @jwt_required()
-    @api.expect(api.model('ChangePassword', {
-        'current_password': fields.String(required=True),
-        'new_password': fields.String(required=True)
-    }))
+    @api.expect(change_password_model)
     @api.doc(security='Bearer Auth')
     def post(self):
-        current_user = User.query.get(get_jwt_identity())
-        data = request.json
-        
+        data = change_password_validator.validate()
+
         if not current_user.check_password(data['current_password']):
             return {'message': 'Current password is incorrect'}, 400
-        
-        if not is_valid_password(data['new_password']):
-            return {'message': 'New password must be at least 8 characters long'}, 400
-        
+
         current_user.set_password(data['new_password'])
+        current_user.revoke_tokens()
         db.session.commit()
+        invalidate_user(current_user.id)
+        audit_log.record('password_change', actor_id=current_user.id, target_id=current_user.id)
         return {'message': 'Password changed successfully'}, 200
         
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""Serving the OpenAPI (Swagger 2.0) spec as prebuilt bytes.
+
+flask-restx rebuilds and re-encodes ``swagger.json`` on every request. The
+spec only changes with the code, so it is encoded once per app, on first
+use, and served with a strong ETag. A file written by ``python run.py spec``
+can be served instead via ``API_SPEC_FILE``, and then the spec is never built
+in the server at all.
+"""
+import hashlib
+import os
+from http import HTTPStatus
+from flask import current_app, request
+from flask_restx import Api, Resource
+from app.serializers import dumps_bytes
+
+
+class Spec:
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+
+
+def build_spec(api):
+    """Encode the spec of ``api``; needs a request context for its base path."""
+    schema = api.__schema__
+    if 'error' in schema:
+        raise RuntimeError(f"Unable to render the API spec: {schema['error']}")
+    return dumps_bytes(schema)
+
+
+def load_spec(api):
+    spec = current_app.extensions.get('api_spec')
+    if spec is None:
+        path = current_app.config['API_SPEC_FILE']
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                spec = Spec(f.read())
+        else:
+            spec = Spec(build_spec(api))
+        # Two threads racing here build identical bytes, so no lock is needed
+        current_app.extensions['api_spec'] = spec
+    return spec
+
+
+class SpecView(Resource):
+    def get(self):
+        spec = load_spec(self.api)
+        response = current_app.response_class(spec.body, mimetype='application/json')
+        response.set_etag(spec.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['API_SPEC_MAX_AGE']
+        return response.make_conditional(request)
+
+
+class CachedSpecApi(Api):
+    """``Api`` serving the cached spec and the Swagger UI only when ``API_DOC_ENABLED``."""
+
+    def _register_specs(self, app_or_blueprint):
+        if self._add_specs:
+            self._register_view(app_or_blueprint, SpecView, self.default_namespace,
+                                '/' + self.default_swagger_filename, endpoint='specs',
+                                resource_class_args=(self,))
+            self.endpoints.add('specs')
+
+    def render_doc(self):
+        if not current_app.config['API_DOC_ENABLED']:
+            self.abort(HTTPStatus.NOT_FOUND)
+        return super().render_doc()
@@ -0,0 +1,13 @@
+from flask_restx import Namespace, Resource
+from app import db
+from app.dbpool import pool_snapshot
+from app.identity import claims_required
+
+api = Namespace('system', description='Operational endpoints', security='Bearer')
+
+@api.route('/pool')
+class PoolStatus(Resource):
+    @claims_required(admin=True)
+    @api.doc(security='Bearer Auth')
+    def get(self):
+        return {bind or 'default': pool_snapshot(engine) for bind, engine in db.engines.items()}, 200
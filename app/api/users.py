@@ -1,56 +1,344 @@
-from flask_restx import Namespace, Resource, fields
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime
+from functools import lru_cache
+from operator import attrgetter
+from flask import Response, current_app, request, stream_with_context, url_for
+from flask_restx import Namespace, Resource, fields, inputs
+from flask_jwt_extended import current_user
+from sqlalchemy.exc import IntegrityError
 from app.models import User
-from app import db
+from app import db, audit_log
+from app.identity import claims_required, invalidate_user
+from app.api.auth import duplicate_user_message
+from app.validation import PayloadValidator, check_email, check_ids, check_username
+from app.routing import read_only
+from app.pagination import encode_cursor, decode_cursor, clamp_limit, link_header
+from app.serializers import compile_serializer, dumps_bytes, json_response
+from app.conditional import entity_tag, user_etag, not_modified, not_modified_response, set_validators, if_match_failed
 
 api = Namespace('users', description='User operations', security='Bearer')
 
 user_model = api.model('User', {
     'id': fields.Integer(readonly=True),
-    'username': fields.String(required=True),
-    'email': fields.String(required=True),
-    'first_name': fields.String(required=True),
-    'last_name': fields.String(required=True),
-    'role': fields.String(required=True),
+    'username': fields.String(required=True, max_length=64),
+    'email': fields.String(required=True, max_length=120),
+    'first_name': fields.String(required=True, max_length=64),
+    'last_name': fields.String(required=True, max_length=64),
+    'role': fields.String(enum=['Admin', 'User'], description='Admin only; kept when omitted'),
     'is_active': fields.Boolean(required=True),
     'created_at': fields.DateTime(readonly=True),
     'updated_at': fields.DateTime(readonly=True)
 })
 
+user_patch_model = api.model('UserPatch', {
+    'username': fields.String(max_length=64),
+    'email': fields.String(max_length=120),
+    'first_name': fields.String(max_length=64),
+    'last_name': fields.String(max_length=64),
+    'role': fields.String(enum=['Admin', 'User'], description='Admin only'),
+    'is_active': fields.Boolean
+})
+
+user_validator = PayloadValidator(user_model, checks={
+    'username': check_username,
+    'email': check_email
+})
+
+user_patch_validator = PayloadValidator(user_patch_model, checks={
+    'username': check_username,
+    'email': check_email
+})
+
+@lru_cache(maxsize=128)
+def user_serializer(names):
+    return compile_serializer(user_model, names)
+
+def user_columns(names):
+    return [getattr(User, name) for name in names]
+
+def serialize_user(user):
+    serialize = user_serializer(tuple(user_model))
+    return serialize(attrgetter(*serialize.names)(user))
+
+batch_model = api.model('UserBatch', {
+    'ids': fields.List(fields.Integer, required=True, description='User ids'),
+    'action': fields.String(required=True, enum=['promote', 'deactivate', 'activate', 'delete'])
+})
+
+batch_validator = PayloadValidator(batch_model, checks={'ids': check_ids})
+
+batch_result_model = api.model('UserBatchResult', {
+    'id': fields.Integer,
+    'status': fields.Integer,
+    'message': fields.String
+})
+
+batch_response_model = api.model('UserBatchResponse', {
+    'action': fields.String,
+    'succeeded': fields.Integer,
+    'failed': fields.Integer,
+    'results': fields.List(fields.Nested(batch_result_model))
+})
+
+# Per action: the column values to set, and a predicate for rows already in that state
+BATCH_UPDATES = {
+    'promote': ({'role': 'Admin'}, lambda row: row.role == 'Admin', 'User promoted to Admin'),
+    'deactivate': ({'is_active': False}, lambda row: not row.is_active, 'User deactivated'),
+    'activate': ({'is_active': True}, lambda row: row.is_active, 'User activated')
+}
+
+SORTABLE_COLUMNS = {
+    'id': User.id,
+    'created_at': User.created_at,
+    'username': User.username,
+    'email': User.email
+}
+
+filter_parser = api.parser()
+filter_parser.add_argument('role', type=str, location='args', choices=('Admin', 'User'), help='Only users with this role')
+filter_parser.add_argument('is_active', type=inputs.boolean, location='args', help='Only active or inactive users')
+filter_parser.add_argument('created_after', type=inputs.datetime_from_iso8601, location='args',
+                           help='Created at or after this ISO 8601 timestamp')
+filter_parser.add_argument('created_before', type=inputs.datetime_from_iso8601, location='args',
+                           help='Created before this ISO 8601 timestamp')
+filter_parser.add_argument('username_prefix', type=str, location='args', help='Username starts with')
+filter_parser.add_argument('email_prefix', type=str, location='args', help='Email starts with (case-insensitive)')
+
+list_parser = filter_parser.copy()
+list_parser.add_argument('limit', type=int, location='args', help='Page size')
+list_parser.add_argument('cursor', type=str, location='args', help='Opaque cursor from a previous page')
+list_parser.add_argument('sort', type=str, location='args', default='id',
+                         choices=tuple(SORTABLE_COLUMNS) + tuple(f'-{key}' for key in SORTABLE_COLUMNS),
+                         help='Sort column; prefix with - for descending')
+list_parser.add_argument('fields', type=str, location='args',
+                         help='Comma-separated fields to return, e.g. id,username,email')
+
+stream_parser = filter_parser.copy()
+stream_parser.add_argument('format', type=str, location='args', choices=('ndjson', 'json'), default='ndjson',
+                           help='ndjson (one user per line) or json (a single chunked array)')
+
+search_parser = api.parser()
+search_parser.add_argument('q', type=str, location='args', required=True,
+                           help='Part of a username, email, first or last name')
+search_parser.add_argument('limit', type=int, location='args', help='Maximum number of results')
+
+def search_users(term, limit, candidates):
+    """Rank users matching ``term``: exact, then prefix, then substring matches.
+
+    Candidates come from lookups that each stop after ``candidates`` rows,
+    bounding the cost of very broad terms: username and email prefixes, in
+    index order, so exact and shortest matches come first, and for terms of
+    three or more characters substring matches anywhere (a trigram index scan
+    on PostgreSQL), in no particular order. Only those candidates are ranked.
+    """
+    lowered = term.lower()
+    username, email = db.func.lower(User.username), db.func.lower(User.email)
+
+    def first_candidates(where, *order_by):
+        return db.select(db.select(User.id).where(where).order_by(*order_by).limit(candidates).subquery())
+
+    lookups = [
+        first_candidates(username.startswith(lowered, autoescape=True), username),
+        first_candidates(email.startswith(lowered, autoescape=True), email),
+    ]
+    if len(lowered) >= 3:
+        lookups.append(first_candidates(User.search_text().contains(lowered, autoescape=True)))
+    matched = db.union(*lookups).subquery()
+
+    rank = db.case(
+        (db.or_(username == lowered, email == lowered), 0),
+        (db.or_(username.startswith(lowered, autoescape=True), email.startswith(lowered, autoescape=True)), 1),
+        (db.or_(db.func.lower(User.first_name).startswith(lowered, autoescape=True),
+                db.func.lower(User.last_name).startswith(lowered, autoescape=True)), 2),
+        else_=3
+    )
+    if db.session.get_bind().dialect.name == 'postgresql':
+        closeness = db.func.word_similarity(lowered, User.search_text()).desc()
+    else:
+        closeness = db.func.length(User.username)
+
+    serialize = user_serializer(tuple(user_model))
+    query = (
+        db.select(*user_columns(serialize.names))
+        .join(matched, matched.c.id == User.id)
+        .order_by(rank, closeness, User.id)
+        .limit(limit)
+    )
+    return [serialize(row) for row in db.session.execute(query)]
+
+def apply_user_filters(query, args):
+    if args['role']:
+        query = query.filter(User.role == args['role'])
+    if args['is_active'] is not None:
+        query = query.filter(User.is_active == args['is_active'])
+    if args['created_after']:
+        query = query.filter(User.created_at >= args['created_after'])
+    if args['created_before']:
+        query = query.filter(User.created_at < args['created_before'])
+    if args['username_prefix']:
+        query = query.filter(User.username.startswith(args['username_prefix'], autoescape=True))
+    if args['email_prefix']:
+        query = query.filter(db.func.lower(User.email).startswith(args['email_prefix'].lower(), autoescape=True))
+    return query
+
+def requested_fields(value):
+    if not value:
+        return list(user_model)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in user_model]
+    if unknown or not names:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}" if unknown else 'fields cannot be empty')
+    return names
+
 @api.route('/')
 class UserList(Resource):
-    @api.marshal_list_with(user_model)
-    @jwt_required()
+    @api.expect(list_parser)
+    @api.response(200, 'Success', [user_model])
+    @claims_required(admin=True)
+    @read_only
+    @api.doc(security='Bearer Auth')
+    def get(self):
+        args = list_parser.parse_args()
+        descending = args['sort'].startswith('-')
+        sort_key = args['sort'].lstrip('-')
+        # Keyset on (sort column, id) so pages are index range scans
+        key_columns = [User.id] if sort_key == 'id' else [SORTABLE_COLUMNS[sort_key], User.id]
+        try:
+            limit = clamp_limit(args['limit'],
+                                current_app.config['USERS_PAGE_DEFAULT_LIMIT'],
+                                current_app.config['USERS_PAGE_MAX_LIMIT'])
+            field_names = requested_fields(args['fields'])
+            after = (decode_cursor(args['cursor'], [column.type.python_type for column in key_columns])
+                     if args['cursor'] else None)
+        except (ValueError, TypeError) as e:
+            api.abort(400, str(e))
+
+        # Select only the requested columns (plus keyset and version columns) as plain tuples
+        column_names = list(dict.fromkeys(field_names + [column.key for column in key_columns] + ['id', 'updated_at']))
+        query = db.select(*user_columns(column_names))
+        query = apply_user_filters(query, args)
+        if after is not None:
+            key = key_columns[0] if len(key_columns) == 1 else db.tuple_(*key_columns)
+            value = after[0] if len(key_columns) == 1 else db.tuple_(*after)
+            query = query.filter(key < value if descending else key > value)
+        query = query.order_by(*[column.desc() if descending else column for column in key_columns])
+        rows = db.session.execute(query.limit(limit + 1)).all()
+
+        # The page, and whether another follows, is versioned by the (id, updated_at)
+        # of the rows fetched; no aggregate over the whole filtered set is needed
+        id_index, updated_index = column_names.index('id'), column_names.index('updated_at')
+        version = [(row[id_index], row[updated_index]) for row in rows]
+        # No Last-Modified: deleting a row, or one leaving the page, does not
+        # raise the newest updated_at, so only the ETag can tell
+        etag = entity_tag('users', sorted(request.args.items(multi=True)), version)
+        if not_modified(etag):
+            return not_modified_response(etag)
+
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor([
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in (last[column_names.index(column.key)] for column in key_columns)
+            ])
+            params = {k: v for k, v in request.args.items() if k != 'cursor'}
+            next_url = url_for('api.users_user_list', **params, cursor=next_cursor, _external=True)
+            headers['X-Next-Cursor'] = next_cursor
+            headers['Link'] = link_header(next_url, 'next')
+
+        # Keyset columns that were not requested sit after the requested ones and are dropped here
+        serialize = user_serializer(tuple(field_names))
+        response = json_response([serialize(row) for row in rows], 200, headers)
+        return set_validators(response, etag)
+
+@api.route('/stream')
+class UserStream(Resource):
+    @api.expect(stream_parser)
+    @api.produces(['application/x-ndjson', 'application/json'])
+    @claims_required(admin=True)
+    @read_only
     @api.doc(security='Bearer Auth')
     def get(self):
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role != 'Admin':
-            return {'message': 'Admin access required'}, 403
-        return User.query.all()
+        args = stream_parser.parse_args()
+        output = args['format']
+        batch_size = current_app.config['USERS_STREAM_BATCH_SIZE']
+        # yield_per uses a server-side cursor, so only one batch is held in memory
+        serialize = user_serializer(tuple(user_model))
+        query = apply_user_filters(db.select(*user_columns(serialize.names)), args)
+        query = query.order_by(User.id).execution_options(yield_per=batch_size)
+
+        def generate():
+            rows = db.session.execute(query)
+            if output == 'json':
+                yield b'['
+            for i, row in enumerate(rows):
+                line = dumps_bytes(serialize(row))
+                if output == 'json':
+                    yield (b',' if i else b'') + line
+                else:
+                    yield line + b'\n'
+            if output == 'json':
+                yield b']'
+
+        mimetype = 'application/json' if output == 'json' else 'application/x-ndjson'
+        return Response(stream_with_context(generate()), mimetype=mimetype)
+
+@api.route('/search')
+class UserSearch(Resource):
+    @api.expect(search_parser)
+    @api.response(200, 'Success', [user_model])
+    @claims_required(admin=True)
+    @read_only
+    @api.doc(security='Bearer Auth')
+    def get(self):
+        args = search_parser.parse_args()
+        term = args['q'].strip()
+        if not term or len(term) > 100:
+            api.abort(400, 'q must be between 1 and 100 characters')
+        try:
+            limit = clamp_limit(args['limit'],
+                                current_app.config['USERS_SEARCH_DEFAULT_LIMIT'],
+                                current_app.config['USERS_SEARCH_MAX_LIMIT'])
+        except ValueError as e:
+            api.abort(400, str(e))
+        return json_response(search_users(term, limit, current_app.config['USERS_SEARCH_CANDIDATES']))
 
 @api.route('/<int:id>')
 class UserResource(Resource):
-    @api.marshal_with(user_model)
-    @jwt_required()
+    @api.response(200, 'Success', user_model)
+    @api.response(304, 'Not modified')
+    @claims_required(admin=True, owner_arg='id')
+    @read_only
     @api.doc(security='Bearer Auth')
     def get(self, id):
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role != 'Admin' and current_user.id != id:
-            return {'message': 'Unauthorized'}, 403
-        return User.query.get_or_404(id)
+        serialize = user_serializer(tuple(user_model))
+        row = db.session.execute(db.select(*user_columns(serialize.names)).where(User.id == id)).first()
+        if row is None:
+            api.abort(404)
+        updated_at = row._mapping['updated_at']
+        etag = user_etag(id, updated_at)
+        if not_modified(etag, updated_at):
+            return not_modified_response(etag, updated_at)
+        return set_validators(json_response(serialize(row)), etag, updated_at)
 
     @api.expect(user_model)
-    @api.marshal_with(user_model)
-    @jwt_required()
+    @api.response(200, 'Success', user_model)
+    @api.response(412, 'If-Match does not match the current version')
+    @claims_required(admin=True, owner_arg='id')
     @api.doc(security='Bearer Auth')
     def put(self, id):
-        current_user = User.query.get(get_jwt_identity())
-        user = User.query.get_or_404(id)
-        
-        if current_user.role != 'Admin' and current_user.id != id:
-            return {'message': 'Unauthorized'}, 403
+        data = user_validator.validate()
+        # Lock the row so the If-Match check and the update see the same version
+        query = db.select(User).where(User.id == id)
+        if 'If-Match' in request.headers:
+            query = query.with_for_update()
+        user = db.session.execute(query).scalar()
+        if user is None:
+            api.abort(404)
+        if if_match_failed(user_etag(user.id, user.updated_at)):
+            db.session.rollback()
+            api.abort(412, 'User was modified by another request')
 
-        data = api.payload
         user.username = data['username']
         user.email = data['email']
         user.first_name = data['first_name']
@@ -60,35 +348,166 @@ class UserResource(Resource):
         if current_user.role == 'Admin' and 'role' in data:
             user.role = data['role']
 
+        # Role or status changes invalidate the claims in outstanding tokens
+        attrs = db.inspect(user).attrs
+        if attrs.role.history.has_changes() or attrs.is_active.history.has_changes():
+            user.revoke_tokens()
+        changed = sorted(
+            name for name in ('username', 'email', 'first_name', 'last_name', 'is_active', 'role')
+            if attrs[name].history.has_changes()
+        )
+
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            api.abort(409, duplicate_user_message(data['username'], data['email'], e, exclude_id=id))
+        invalidate_user(id)
+        audit_log.record('user_update', actor_id=current_user.id, target_id=id, fields=changed)
+        return set_validators(json_response(serialize_user(user)), user_etag(user.id, user.updated_at), user.updated_at)
+
+    @api.expect(user_patch_model)
+    @api.response(200, 'Success', user_model)
+    @api.response(412, 'If-Match does not match the current version')
+    @claims_required(admin=True, owner_arg='id')
+    @api.doc(security='Bearer Auth')
+    def patch(self, id):
+        data = user_patch_validator.validate()
+        if not data:
+            api.abort(400, 'No fields to update')
+        if 'role' in data and current_user.role != 'Admin':
+            api.abort(403, 'Admin access required to change roles')
+
+        if 'If-Match' in request.headers:
+            # The ETag cannot be compared in SQL, so conditional updates lock and check first
+            updated_at = db.session.execute(
+                db.select(User.updated_at).where(User.id == id).with_for_update()
+            ).scalar()
+            if updated_at is not None and if_match_failed(user_etag(id, updated_at)):
+                db.session.rollback()
+                api.abort(412, 'User was modified by another request')
+
+        # Token claims may be up to AUTH_CLAIMS_CACHE_TTL old; re-check admin rights in the statement
+        caller = db.aliased(User)
+        caller_is_admin = db.select(caller.id).where(
+            caller.id == current_user.id, caller.role == 'Admin', caller.is_active.is_(True)
+        ).exists()
+        allowed = caller_is_admin if ('role' in data or id != current_user.id) else db.true()
+
+        values = dict(data)
+        # Role or status changes invalidate the claims in outstanding tokens
+        revoking = [getattr(User, name) != data[name] for name in ('role', 'is_active') if name in data]
+        if revoking:
+            values['token_version'] = db.case((db.or_(*revoking), User.token_version + 1),
+                                              else_=User.token_version)
+
+        serialize = user_serializer(tuple(user_model))
+        statement = (
+            db.update(User).where(User.id == id, allowed).values(**values)
+            .returning(*user_columns(serialize.names))
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            row = db.session.execute(statement).first()
+        except IntegrityError as e:
+            db.session.rollback()
+            api.abort(409, duplicate_user_message(data.get('username'), data.get('email'), e, exclude_id=id))
+        if row is None:
+            # Only on failure: tell a missing user from a refused update
+            db.session.rollback()
+            if db.session.execute(db.select(User.id).where(User.id == id)).first() is None:
+                api.abort(404)
+            api.abort(403, 'Admin access required')
         db.session.commit()
-        return user
 
-    @jwt_required()
+        invalidate_user(id)
+        audit_log.record('user_update', actor_id=current_user.id, target_id=id, fields=sorted(data))
+        updated_at = row._mapping['updated_at']
+        return set_validators(json_response(serialize(row)), user_etag(id, updated_at), updated_at)
+
+    @claims_required(admin=True)
     @api.doc(security='Bearer Auth')
     def delete(self, id):
-        current_user = User.query.get(get_jwt_identity())
-        user = User.query.get_or_404(id)
-        
-        if current_user.role != 'Admin':
-            return {'message': 'Admin access required'}, 403
-
+        user = db.get_or_404(User, id)
         if user.role == 'Admin':
             return {'message': 'Cannot delete admin users'}, 403
 
-        db.session.delete(user)
+        username = user.username
+        User.delete_non_admins([id])
         db.session.commit()
+        invalidate_user(id)
+        audit_log.record('user_delete', actor_id=current_user.id, target_id=id, username=username)
         return {'message': 'User deleted'}, 200
 
 @api.route('/promote/<int:id>')
 class PromoteUser(Resource):
-    @jwt_required()
+    @claims_required(admin=True)
     @api.doc(security='Bearer Auth')
     def post(self, id):
-        current_user = User.query.get(get_jwt_identity())
-        if current_user.role != 'Admin':
-            return {'message': 'Admin access required'}, 403
+        user = db.get_or_404(User, id)
+        promoted = user.role != 'Admin'
+        if promoted:
+            user.role = 'Admin'
+            user.revoke_tokens()
+        db.session.commit()
+        invalidate_user(id)
+        if promoted:
+            audit_log.record('user_promote', actor_id=current_user.id, target_id=id)
+        return {'message': 'User promoted to Admin'}, 200
+
+@api.route('/batch')
+class UserBatch(Resource):
+    @api.expect(batch_model)
+    @api.marshal_with(batch_response_model)
+    @claims_required(admin=True)
+    @api.doc(security='Bearer Auth')
+    def post(self):
+        data = batch_validator.validate()
+        action, ids = data['action'], data['ids']
+        if len(ids) > current_app.config['USERS_BATCH_MAX_IDS']:
+            api.abort(413, f"At most {current_app.config['USERS_BATCH_MAX_IDS']} ids per request")
+        ids = list(dict.fromkeys(ids))
 
-        user = User.query.get_or_404(id)
-        user.role = 'Admin'
+        # Lock the targets so the rules are checked against the rows being changed
+        rows = db.session.execute(
+            db.select(User.id, User.role, User.is_active).where(User.id.in_(ids)).with_for_update()
+        ).all()
+        found = {row.id: row for row in rows}
+
+        outcomes = {}
+        targets = []
+        for id in ids:
+            row = found.get(id)
+            if row is None:
+                outcomes[id] = (404, 'User not found')
+            elif action == 'delete':
+                if row.role == 'Admin':
+                    outcomes[id] = (403, 'Cannot delete admin users')
+                else:
+                    outcomes[id] = (200, 'User deleted')
+                    targets.append(id)
+            else:
+                values, unchanged, message = BATCH_UPDATES[action]
+                outcomes[id] = (200, message)
+                if not unchanged(row):
+                    targets.append(id)
+
+        if targets:
+            if action == 'delete':
+                User.delete_non_admins(targets)
+            else:
+                # Role and status are token claims, so outstanding tokens are revoked
+                values = BATCH_UPDATES[action][0]
+                db.session.execute(
+                    db.update(User).where(User.id.in_(targets))
+                    .values(**values, token_version=User.token_version + 1),
+                    execution_options={'synchronize_session': False}
+                )
         db.session.commit()
-        return {'message': 'User promoted to Admin'}, 200
\ No newline at end of file
+        for id in targets:
+            invalidate_user(id)
+            audit_log.record(f'user_{action}', actor_id=current_user.id, target_id=id, batch=True)
+
+        results = [{'id': id, 'status': status, 'message': message} for id, (status, message) in outcomes.items()]
+        succeeded = sum(1 for r in results if r['status'] == 200)
+        return {'action': action, 'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}, 200
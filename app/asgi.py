@@ -0,0 +1,28 @@
+"""ASGI deployment mode (``uvicorn asgi:app``).
+
+The event loop owns the sockets, so idle keep-alive connections and slow
+clients cost no thread. Login and single-user reads are served by native
+async handlers (``app.aio``) unless ``ASGI_ASYNC_ROUTES`` is off. Every other
+request runs the regular Flask app on a bounded thread pool (a2wsgi's
+``WSGIMiddleware``). Size the pool to the database pool so a request never
+holds a thread while it queues for a connection.
+"""
+from a2wsgi import WSGIMiddleware
+
+
+def default_threads(app):
+    """ASGI_THREADS, or the database pool capacity (pool_size + max_overflow) when unset."""
+    if app.config['ASGI_THREADS']:
+        return app.config['ASGI_THREADS']
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if 'pool_size' in options:
+        return options['pool_size'] + options.get('max_overflow', 0)
+    return 10
+
+
+def create_asgi_app(app, threads=None):
+    wsgi = WSGIMiddleware(app, workers=threads or default_threads(app))
+    if not app.config['ASGI_ASYNC_ROUTES']:
+        return wsgi
+    from app.aio import AsyncAPI
+    return AsyncAPI(app, wsgi)
@@ -0,0 +1,126 @@
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from flask import has_request_context, request
+from app.worker import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLog(BackgroundWorker):
+    """Buffered audit trail of security-relevant account changes.
+
+    ``record`` only appends to an in-memory buffer. A background thread
+    writes the buffer to ``audit_event`` with multi-row inserts on its own
+    connection, whenever ``AUDIT_BATCH_SIZE`` events are waiting or every
+    ``AUDIT_FLUSH_INTERVAL`` seconds. The buffer holds at most
+    ``AUDIT_MAX_BUFFER`` events: once full, the recording request flushes it
+    inline, and if that fails too (the database is down) the oldest events
+    are dropped, counted in ``dropped`` and logged. Whatever is left is
+    flushed at interpreter exit.
+    """
+
+    name = 'audit-log'
+    stop_timeout = 10
+
+    def __init__(self, app=None):
+        super().__init__()
+        self.enabled = False
+        self.max_buffer = None
+        self.dropped = 0
+        self._reported = 0
+        self._buffer = deque()
+        self._flush_lock = threading.Lock()
+        self._drop_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['AUDIT_ENABLED']
+        self.batch_size = app.config['AUDIT_BATCH_SIZE']
+        self.interval = app.config['AUDIT_FLUSH_INTERVAL']
+        self.max_buffer = app.config['AUDIT_MAX_BUFFER']
+        self._buffer = deque(self._buffer, maxlen=self.max_buffer)
+        app.extensions['audit_log'] = self
+
+    def record(self, action, actor_id=None, target_id=None, ip=None, **details):
+        if not self.enabled:
+            return
+        self.ensure_started()
+        if len(self._buffer) >= self.max_buffer:
+            # Back-pressure first; events are only dropped if the write fails
+            try:
+                self.flush_all()
+            except Exception:
+                logger.exception('Audit log flush failed')
+            if len(self._buffer) >= self.max_buffer:
+                self._count_dropped(1)
+        # A full deque discards its oldest event to make room
+        self._buffer.append({
+            'created_at': datetime.utcnow(),
+            'action': action,
+            'actor_id': actor_id,
+            'target_id': target_id,
+            'ip': ip or (request.remote_addr if has_request_context() else None),
+            'details': details or None
+        })
+        if len(self._buffer) >= self.batch_size:
+            self.wake()
+
+    def _count_dropped(self, count):
+        with self._drop_lock:
+            self.dropped += count
+
+    def report_dropped(self):
+        with self._drop_lock:
+            count = self.dropped - self._reported
+            self._reported = self.dropped
+        if count:
+            logger.error('Audit log buffer full; dropped %s events (%s in total)', count, self.dropped)
+
+    def stop(self, timeout=None):
+        super().stop(timeout)
+        # Durable shutdown: write out anything recorded after the last flush
+        with self.app.app_context():
+            self.flush_all()
+        self.report_dropped()
+
+    def run_once(self):
+        self.report_dropped()
+        self.flush_all()
+
+    def flush_all(self):
+        written = 0
+        while True:
+            count = self.flush()
+            written += count
+            if count < self.batch_size:
+                return written
+
+    def flush(self):
+        """Write up to one batch of buffered events; returns how many were written."""
+        from app import db
+        from app.models import AuditEvent
+
+        with self._flush_lock:
+            batch = []
+            while self._buffer and len(batch) < self.batch_size:
+                batch.append(self._buffer.popleft())
+            if not batch:
+                return 0
+            try:
+                # executemany is sent as multi-row INSERTs; a separate connection keeps
+                # audit writes out of any request transaction
+                with db.engine.begin() as connection:
+                    connection.execute(db.insert(AuditEvent), batch)
+            except Exception:
+                # Keep the events, in order, for the next attempt; if new ones
+                # filled the buffer meanwhile, the newest are dropped
+                overflow = len(self._buffer) + len(batch) - self.max_buffer
+                self._buffer.extendleft(reversed(batch))
+                if overflow > 0:
+                    self._count_dropped(overflow)
+                raise
+            return len(batch)
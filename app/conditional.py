@@ -0,0 +1,36 @@
+import hashlib
+from flask import current_app, request
+from werkzeug.http import is_resource_modified
+
+
+def entity_tag(*parts):
+    raw = ':'.join('' if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode()).hexdigest()[:32]
+
+
+def user_etag(id, updated_at):
+    return entity_tag('user', id, updated_at.isoformat() if updated_at else None)
+
+
+def not_modified(etag, last_modified=None):
+    return not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Clients may keep the body but must revalidate, and only for this caller
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified_response(etag, last_modified=None):
+    return set_validators(current_app.response_class(status=304), etag, last_modified)
+
+
+def if_match_failed(etag):
+    """True when the request carries If-Match and none of its tags match ``etag``."""
+    if 'If-Match' not in request.headers:
+        return False
+    return not request.if_match.contains(etag)
@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Outside the app.* hierarchy so DEBUG app logging does not pull pool chatter
+# into the checkout path; configure it explicitly to see pool warnings elsewhere
+logger = logging.getLogger('sqlalchemy.pool.stats')
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.checked_out_max = 0
+
+    def record_checkout(self, wait, overflowed, checked_out):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out_max = max(self.checked_out_max, checked_out)
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            if overflowed:
+                self.overflow_events += 1
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'overflow_events': self.overflow_events,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+                'checked_out_max': self.checked_out_max,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait time, overflow use and timeouts."""
+
+    slow_checkout_seconds = 0.1
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        event.listen(self, 'invalidate', lambda *args: self.stats.incr('invalidations'))
+
+    def _create_connection(self):
+        self.stats.incr('connects')
+        return super()._create_connection()
+
+    def connect(self):
+        overflow_before = self._overflow
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except TimeoutError:
+            self.stats.incr('timeouts')
+            logger.error('Connection pool exhausted after %.2fs: %s', time.perf_counter() - start, self.status())
+            raise
+        wait = time.perf_counter() - start
+        overflowed = self._overflow > overflow_before and self._overflow > 0
+        self.stats.record_checkout(wait, overflowed, self.checkedout())
+        if wait > self.slow_checkout_seconds:
+            logger.warning('Slow connection checkout (%.3fs): %s', wait, self.status())
+        return conn
+
+
+def pool_snapshot(engine):
+    pool = engine.pool
+    snapshot = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        snapshot.update(size=pool.size(), checked_out=pool.checkedout(),
+                        checked_in=pool.checkedin(), overflow=pool.overflow())
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        snapshot.update(stats.as_dict())
+    return snapshot
+
+
+def init_pool_stats(app):
+    """Use the instrumented pool unless a pool class is configured."""
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    in_memory = uri in ('sqlite://', 'sqlite:///:memory:')
+    if 'poolclass' not in options and not in_memory:
+        options['poolclass'] = InstrumentedQueuePool
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    InstrumentedQueuePool.slow_checkout_seconds = app.config['DB_POOL_SLOW_CHECKOUT_MS'] / 1000
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+from app.metrics import PASSWORD_HASH_DURATION
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool has no free slot for another request."""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing capacity exhausted')
+        self.retry_after = retry_after
+
+
+def method_prefix(method):
+    """The ``method$`` prefix werkzeug writes for ``method``, with its defaults filled in."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = args or (2 ** 15, 8, 1)
+        return f'scrypt:{int(n)}:{int(r)}:{int(p)}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    return method
+
+
+class PasswordHasher:
+    """Runs password KDF work in a bounded process pool.
+
+    At most ``PASSWORD_HASH_MAX_PENDING`` hashes may be queued or running at a
+    time; beyond that callers get :class:`HashingBusy` instead of piling up
+    behind the pool. With ``PASSWORD_HASH_WORKERS = 0`` hashing runs inline.
+    """
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.salt_length = app.config['PASSWORD_HASH_SALT_LENGTH']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self.retry_after = app.config['PASSWORD_HASH_RETRY_AFTER']
+        self._slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_MAX_PENDING'])
+        self._bulk_slots = threading.BoundedSemaphore(max(1, app.config['PASSWORD_HASH_MAX_PENDING'] // 2))
+        self._method_prefix = method_prefix(self.method)
+        app.extensions['password_hasher'] = self
+
+    def _get_executor(self):
+        # Worker processes do not survive a fork, so each process gets its own pool
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, operation, fn, *args):
+        start = time.perf_counter()
+        try:
+            return self._call(fn, *args)
+        finally:
+            PASSWORD_HASH_DURATION.observe(time.perf_counter() - start, operation)
+
+    def _call(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HashingBusy(self.retry_after)
+        future = self._submit(slots.release, fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy(self.retry_after)
+
+    def _submit(self, release, fn, *args):
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            release()
+            raise
+        # The slot is held until the job finishes, even if the caller gave up
+        # waiting, so timed-out work still counts against the limit
+        future.add_done_callback(lambda _: release())
+        return future
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method, self.salt_length)
+
+    def hash_many(self, passwords):
+        """Hash a batch of passwords across the workers, taking a slot per job.
+
+        A batch keeps at most half of the slots queued or running, so single
+        hashes and verifies still get a slot and wait behind only that many
+        batch jobs.
+        """
+        if not self.workers:
+            return [generate_password_hash(p, self.method, self.salt_length) for p in passwords]
+        futures = []
+        try:
+            for password in passwords:
+                # Wait for this batch's own jobs first, then for a shared slot
+                self._bulk_slots.acquire()
+                if not self._slots.acquire(timeout=self.timeout):
+                    self._bulk_slots.release()
+                    raise HashingBusy(self.retry_after)
+                futures.append(self._submit(self._release_bulk_slot, generate_password_hash, password,
+                                            self.method, self.salt_length))
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def _release_bulk_slot(self):
+        self._slots.release()
+        self._bulk_slots.release()
+
+    def verify(self, pwhash, password):
+        return self._run('verify', check_password_hash, pwhash, password)
+
+    async def _run_async(self, operation, fn, *args):
+        """Like ``_run``, for the event loop: awaiting the job holds no thread."""
+        start = time.perf_counter()
+        try:
+            if not self.workers:
+                return fn(*args)
+            slots = self._slots
+            if not slots.acquire(blocking=False):
+                raise HashingBusy(self.retry_after)
+            try:
+                future = asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+            except BaseException:
+                slots.release()
+                raise
+            future.add_done_callback(lambda _: slots.release())
+            try:
+                # shield: a timed-out job keeps running, and keeps its slot
+                return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except asyncio.TimeoutError:
+                raise HashingBusy(self.retry_after)
+        finally:
+            PASSWORD_HASH_DURATION.observe(time.perf_counter() - start, operation)
+
+    async def hash_async(self, password):
+        return await self._run_async('hash', generate_password_hash, password, self.method, self.salt_length)
+
+    async def verify_async(self, pwhash, password):
+        return await self._run_async('verify', check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if ``pwhash`` was made with a different method or cost than configured."""
+        # Only compares strings, so it is safe on a request thread or the event loop
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
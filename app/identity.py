@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g
+from flask_restx import abort
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from app import db, jwt
+from app.models import User
+from app.revocation import token_blocklist
+
+
+class ClaimsCache:
+    """Bounded LRU of per-identity authorization claims with a short TTL."""
+
+    def __init__(self, maxsize=10000, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+claims_cache = ClaimsCache()
+
+
+class CurrentUser:
+    """The authenticated caller.
+
+    ``id``, ``role`` and ``is_active`` are available without touching the
+    database; any other attribute loads the ``User`` row once and forwards to it.
+    """
+
+    def __init__(self, id, role, is_active, user=None):
+        self.id = id
+        self.role = role
+        self.is_active = is_active
+        self._user = user
+
+    @property
+    def instance(self):
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        return getattr(self.instance, name)
+
+
+def token_claims(user):
+    """Additional claims embedded in access tokens issued for ``user``."""
+    return {'role': user.role, 'active': user.is_active, 'ver': user.token_version or 0}
+
+
+def invalidate_user(identity):
+    claims_cache.invalidate(int(identity))
+
+
+def lookup_claims(identity):
+    """Current role, active flag and token version for ``identity``.
+
+    Memoized per request and, when enabled, cached across requests, so the
+    revocation check and the user loader share a single lookup.
+    """
+    memo = g.setdefault('_auth_claims', {})
+    if identity in memo:
+        return memo[identity]
+
+    use_cache = current_app.config['AUTH_CLAIMS_CACHE_ENABLED']
+    claims = claims_cache.get(identity) if use_cache else None
+    if claims is None:
+        row = db.session.execute(
+            db.select(User.role, User.is_active, User.token_version).filter_by(id=identity)
+        ).first()
+        if row is not None:
+            claims = {'id': identity, 'role': row.role, 'is_active': row.is_active,
+                      'token_version': row.token_version or 0}
+            if use_cache:
+                claims_cache.set(identity, claims)
+
+    memo[identity] = claims
+    return claims
+
+
+@jwt.token_in_blocklist_loader
+def is_token_revoked(jwt_header, jwt_data):
+    # Tokens carry the user's token version; bumping it revokes every
+    # token issued before a role, status or password change.
+    if 'ver' not in jwt_data:
+        return True
+    # Individually revoked tokens (logout); answered from memory
+    if token_blocklist.is_revoked(jwt_data['jti'], jwt_data['exp']):
+        return True
+    claims = lookup_claims(int(jwt_data[current_app.config['JWT_IDENTITY_CLAIM']]))
+    return claims is None or claims['token_version'] != jwt_data['ver']
+
+
+@jwt.user_lookup_loader
+def load_current_user(jwt_header, jwt_data):
+    claims = lookup_claims(int(jwt_data[current_app.config['JWT_IDENTITY_CLAIM']]))
+    if claims is None:
+        return None
+    return CurrentUser(claims['id'], claims['role'], claims['is_active'])
+
+
+def claims_required(admin=False, owner_arg=None):
+    """Authorize the request from the access token claims alone.
+
+    With ``admin=True`` the caller must be an Admin, unless ``owner_arg`` names
+    a view argument that equals the caller's own id.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            claims = get_jwt()
+            if not claims['active']:
+                abort(403, 'Account is inactive')
+            if admin and claims['role'] != 'Admin':
+                if owner_arg is None:
+                    abort(403, 'Admin access required')
+                if kwargs.get(owner_arg) != int(get_jwt_identity()):
+                    abort(403, 'Unauthorized')
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_identity(app):
+    claims_cache.maxsize = app.config['AUTH_CLAIMS_CACHE_SIZE']
+    claims_cache.ttl = app.config['AUTH_CLAIMS_CACHE_TTL']
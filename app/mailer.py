@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask_mail import Message
+from sqlalchemy import event
+from app.metrics import MAIL_SEND_DURATION
+from app.worker import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPBackend:
+    """Sends a whole batch over one Flask-Mail SMTP connection."""
+
+    def __init__(self, mail):
+        self.mail = mail
+
+    @contextmanager
+    def connection(self):
+        with self.mail.connect() as conn:
+            yield conn.send
+
+
+class MemoryBackend:
+    """Keeps sent messages in ``outbox``; for tests and benchmarks."""
+
+    def __init__(self):
+        self.outbox = []
+
+    @contextmanager
+    def connection(self):
+        yield self.outbox.append
+
+
+class FileBackend:
+    """Writes each message as an ``.eml`` file under ``path``."""
+
+    def __init__(self, path):
+        self.path = path
+
+    @contextmanager
+    def connection(self):
+        os.makedirs(self.path, exist_ok=True)
+
+        def send(message):
+            name = f'{datetime.utcnow():%Y%m%d%H%M%S%f}-{threading.get_ident()}.eml'
+            with open(os.path.join(self.path, name), 'w') as f:
+                f.write(message.as_string())
+
+        yield send
+
+
+class MailQueue(BackgroundWorker):
+    """Durable outbound mail queue.
+
+    Messages are written to the ``mail_outbox`` table as part of the caller's
+    transaction and delivered by a background thread in batches over a single
+    backend connection, with exponential backoff on failure.
+    """
+
+    name = 'mail-queue'
+
+    def __init__(self, app=None):
+        super().__init__()
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db, mail
+
+        self.app = app
+        self.batch_size = app.config['MAIL_QUEUE_BATCH_SIZE']
+        self.interval = app.config['MAIL_QUEUE_POLL_INTERVAL']
+        self.max_attempts = app.config['MAIL_QUEUE_MAX_ATTEMPTS']
+        self.retry_backoff = app.config['MAIL_QUEUE_RETRY_BACKOFF']
+
+        backend = app.config['MAIL_BACKEND']
+        if backend == 'memory':
+            self.backend = MemoryBackend()
+        elif backend == 'file':
+            self.backend = FileBackend(app.config['MAIL_FILE_PATH'])
+        else:
+            self.backend = SMTPBackend(mail)
+
+        if app.config['MAIL_QUEUE_ENABLED']:
+            app.before_request(self.ensure_started)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        app.extensions['mail_queue'] = self
+
+    def enqueue(self, recipient, subject, body, sender=None):
+        """Add a message to the outbox; it is sent once the session commits."""
+        from app import db
+        from app.models import OutboxMessage
+
+        message = OutboxMessage(
+            sender=sender or self.app.config['MAIL_DEFAULT_SENDER'],
+            recipient=recipient,
+            subject=subject,
+            body=body
+        )
+        db.session.add(message)
+        db.session.info['mail_enqueued'] = True
+        return message
+
+    def _after_commit(self, session):
+        if session.info.pop('mail_enqueued', False):
+            self.wake()
+
+    def run_once(self):
+        while self.flush() == self.batch_size and not self.stopping:
+            pass
+
+    def flush(self):
+        """Deliver one batch of due messages; returns how many were attempted."""
+        from app import db
+        from app.models import OutboxMessage
+
+        now = datetime.utcnow()
+        batch = db.session.execute(
+            db.select(OutboxMessage)
+            .filter(OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= now)
+            .order_by(OutboxMessage.next_attempt_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not batch:
+            db.session.rollback()
+            return 0
+
+        attempted = set()
+        try:
+            with self.backend.connection() as send:
+                for item in batch:
+                    self._deliver(send, item, now)
+                    attempted.add(item.id)
+        except Exception as e:
+            # The connection itself failed; everything not yet tried is retried later
+            logger.warning('Mail backend connection failed: %s', e)
+            for item in batch:
+                if item.id not in attempted:
+                    self._failed(item, e, now)
+        db.session.commit()
+        return len(batch)
+
+    def _deliver(self, send, item, now):
+        message = Message(item.subject, sender=item.sender, recipients=[item.recipient], body=item.body)
+        start = time.perf_counter()
+        try:
+            send(message)
+        except Exception as e:
+            MAIL_SEND_DURATION.observe(time.perf_counter() - start, 'error')
+            self._failed(item, e, now)
+            return
+        MAIL_SEND_DURATION.observe(time.perf_counter() - start, 'sent')
+        item.status = 'sent'
+        item.sent_at = now
+        item.attempts += 1
+        item.last_error = None
+
+    def _failed(self, item, error, now):
+        item.attempts += 1
+        item.last_error = str(error)
+        if item.attempts >= self.max_attempts:
+            item.status = 'failed'
+            logger.error('Giving up on outbox message %s after %s attempts: %s', item.id, item.attempts, error)
+        else:
+            item.next_attempt_at = now + timedelta(seconds=self.retry_backoff * 2 ** (item.attempts - 1))
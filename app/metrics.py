@@ -0,0 +1,155 @@
+import bisect
+import logging
+import threading
+import time
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(labels, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._values[labels] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield self.name + '_bucket' + _format_labels(self.labelnames, labels, [('le', le)]), cumulative
+            yield self.name + '_count' + _format_labels(self.labelnames, labels), cumulative
+            yield self.name + '_sum' + _format_labels(self.labelnames, labels), total
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name} {value}' for name, value in metric.samples())
+        for collect in self.collectors:
+            lines.extend(collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint', ('endpoint', 'method', 'status')))
+REQUEST_SQL_STATEMENTS = registry.register(Histogram(
+    'http_request_sql_statements', 'SQL statements executed per request', ('endpoint',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100)))
+SQL_DURATION = registry.register(Histogram(
+    'db_statement_duration_seconds', 'SQL statement execution time by endpoint', ('endpoint',)))
+PASSWORD_HASH_DURATION = registry.register(Histogram(
+    'password_hash_duration_seconds', 'Password hash and verify time, including pool wait', ('operation',),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)))
+MAIL_SEND_DURATION = registry.register(Histogram(
+    'mail_send_duration_seconds', 'Time to hand one message to the mail backend', ('result',)))
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context() and 'metrics_sql' in g:
+        g.metrics_sql.append((elapsed, statement))
+        SQL_DURATION.observe(elapsed, _endpoint())
+
+
+def _pool_gauges():
+    from app import db
+    from app.dbpool import pool_snapshot
+
+    snapshots = {bind or 'default': pool_snapshot(engine) for bind, engine in db.engines.items()}
+    lines = []
+    keys = [key for key, value in next(iter(snapshots.values()), {}).items() if isinstance(value, (int, float))]
+    for key in keys:
+        lines.append(f'# TYPE db_pool_{key} gauge')
+        for bind, snapshot in snapshots.items():
+            if key in snapshot:
+                lines.append(f'db_pool_{key}{_format_labels(("bind",), (bind,))} {snapshot[key]}')
+    return lines
+
+
+def init_metrics(app):
+    if not app.config['METRICS_ENABLED']:
+        return
+    if _pool_gauges not in registry.collectors:
+        registry.collectors.append(_pool_gauges)
+    slow_seconds = app.config['METRICS_SLOW_REQUEST_MS'] / 1000
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_sql = []
+
+    @app.after_request
+    def record_request(response):
+        if 'metrics_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        endpoint = _endpoint()
+        REQUEST_LATENCY.observe(elapsed, endpoint, request.method, response.status_code)
+        REQUEST_SQL_STATEMENTS.observe(len(g.metrics_sql), endpoint)
+        if slow_seconds and elapsed > slow_seconds:
+            statements = '\n'.join(f'  {duration * 1000:.1f} ms  {statement}' for duration, statement in g.metrics_sql)
+            logger.warning('Slow request %s %s took %.1f ms with %d SQL statement(s)\n%s',
+                           request.method, request.path, elapsed * 1000, len(g.metrics_sql), statements)
+        return response
+
+    def metrics_view():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -1,9 +1,32 @@
-from app import db
+from app import db, hasher
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy import Enum
+import hashlib
 import secrets
 
+
+def search_text(username, email, first_name, last_name):
+    """Lower-cased searchable text of a user; must match the ix_user_search_trgm expression."""
+    separator = db.literal_column("' '")
+    return db.func.lower(username + separator + email + separator + first_name + separator + last_name)
+
+
+class ExpiringMixin:
+    """Rows that are useless after ``expires_at``; needs ``id`` and ``expires_at`` columns."""
+
+    @classmethod
+    def purge_expired(cls, batch_size=10000):
+        """Delete expired rows in batches; returns the number removed."""
+        removed = 0
+        while True:
+            expired = db.select(cls.id).filter(cls.expires_at <= datetime.utcnow()).limit(batch_size)
+            count = db.session.execute(db.delete(cls).filter(cls.id.in_(expired))).rowcount
+            db.session.commit()
+            removed += count
+            if count < batch_size:
+                return removed
+
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
@@ -15,29 +38,135 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
-    password_reset_token = db.Column(db.String(100), unique=True, nullable=True)
-    password_reset_expiration = db.Column(db.DateTime, nullable=True)
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Support the filters and keyset sorts on GET /users
+    __table_args__ = (
+        db.Index('ix_user_role_id', 'role', 'id'),
+        db.Index('ix_user_is_active_id', 'is_active', 'id'),
+        db.Index('ix_user_created_at_id', 'created_at', 'id'),
+        db.Index('ix_user_username_pattern', 'username', postgresql_ops={'username': 'varchar_pattern_ops'}),
+        db.Index('ix_user_username_lower', db.func.lower(username).label('username_lower'),
+                 postgresql_ops={'username_lower': 'varchar_pattern_ops'}),
+        db.Index('ix_user_email_lower', db.func.lower(email).label('email_lower'),
+                 postgresql_ops={'email_lower': 'varchar_pattern_ops'}),
+        # Trigram index for substring search on PostgreSQL (needs the pg_trgm extension)
+        db.Index('ix_user_search_trgm', search_text(username, email, first_name, last_name).label('search_text'),
+                 postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
+
+    @classmethod
+    def search_text(cls):
+        return search_text(cls.username, cls.email, cls.first_name, cls.last_name)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return hasher.verify(self.password_hash, password)
+
+    def revoke_tokens(self):
+        self.token_version = (self.token_version or 0) + 1
 
     def generate_reset_token(self):
-        self.password_reset_token = secrets.token_urlsafe(32)
-        self.password_reset_expiration = datetime.utcnow() + timedelta(hours=1)
-        db.session.commit()
-        return self.password_reset_token
-
-    def verify_reset_token(self, token):
-        if self.password_reset_token != token:
-            return False
-        if datetime.utcnow() > self.password_reset_expiration:
-            return False
-        return True
+        token = secrets.token_urlsafe(32)
+        db.session.add(PasswordResetToken(
+            user=self,
+            token_hash=PasswordResetToken.hash_token(token),
+            expires_at=datetime.utcnow() + timedelta(hours=1)
+        ))
+        return token
 
     def clear_reset_token(self):
-        self.password_reset_token = None
-        self.password_reset_expiration = None
-        db.session.commit()
\ No newline at end of file
+        db.session.execute(db.delete(PasswordResetToken).filter_by(user_id=self.id))
+
+    @classmethod
+    def delete_non_admins(cls, ids):
+        """Delete the non-admin users in ``ids``, their reset tokens first.
+
+        Admins are re-checked in the statement in case of a concurrent promotion.
+        """
+        db.session.execute(db.delete(PasswordResetToken).where(
+            PasswordResetToken.user_id.in_(db.select(cls.id).where(cls.id.in_(ids), cls.role != 'Admin'))
+        ))
+        return db.session.execute(
+            db.delete(cls).where(cls.id.in_(ids), cls.role != 'Admin'),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+
+
+class PasswordResetToken(ExpiringMixin, db.Model):
+    __tablename__ = 'password_reset_token'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship('User')
+
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @classmethod
+    def find_valid(cls, token):
+        return db.session.execute(
+            db.select(cls)
+            .filter(cls.token_hash == cls.hash_token(token), cls.expires_at > datetime.utcnow())
+            .options(db.joinedload(cls.user))
+        ).scalar_one_or_none()
+
+
+class OutboxMessage(db.Model):
+    __tablename__ = 'mail_outbox'
+    __table_args__ = (
+        db.Index('ix_mail_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(120), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(Enum('pending', 'sent', 'failed', name='mail_outbox_status'), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+class AuditEvent(db.Model):
+    __tablename__ = 'audit_event'
+    __table_args__ = (
+        db.Index('ix_audit_event_actor_id_id', 'actor_id', 'id'),
+        db.Index('ix_audit_event_target_id_id', 'target_id', 'id'),
+        db.Index('ix_audit_event_action_id', 'action', 'id'),
+        db.Index('ix_audit_event_created_at', 'created_at'),
+    )
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    action = db.Column(db.String(64), nullable=False)
+    # No foreign keys: the trail outlives deleted users
+    actor_id = db.Column(db.Integer, nullable=True)
+    target_id = db.Column(db.Integer, nullable=True)
+    ip = db.Column(db.String(45), nullable=True)
+    details = db.Column(db.JSON, nullable=True)
+
+
+class RevokedToken(ExpiringMixin, db.Model):
+    __tablename__ = 'revoked_token'
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# db.create_all() needs pg_trgm before it can build ix_user_search_trgm
+db.event.listen(
+    User.__table__, 'before_create',
+    db.DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
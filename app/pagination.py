@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, types=None):
+    """The keyset values in ``cursor``, checked against the column ``types`` if given.
+
+    Datetimes travel as naive ISO 8601 strings. A cursor of the wrong shape or
+    types raises ``ValueError`` rather than reaching the query.
+    """
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    if types is not None:
+        if len(values) != len(types):
+            raise ValueError('Invalid cursor')
+        values = [cursor_value(value, type_) for value, type_ in zip(values, types)]
+    return values
+
+
+def cursor_value(value, type_):
+    if type_ is datetime:
+        if isinstance(value, str):
+            try:
+                parsed = datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError('Invalid cursor')
+            if parsed.tzinfo is None:
+                return parsed
+    # bool is an int subclass, but never a keyset value
+    elif isinstance(value, type_) and not isinstance(value, bool):
+        return value
+    raise ValueError('Invalid cursor')
+
+
+def clamp_limit(limit, default, maximum):
+    if limit is None:
+        return default
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, maximum)
+
+
+def link_header(url, rel):
+    return f'<{url}>; rel="{rel}"'
@@ -0,0 +1,162 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+
+class RateLimited(Exception):
+    """Raised when a caller has exhausted a rate limit."""
+
+    def __init__(self, retry_after):
+        super().__init__('Rate limit exceeded')
+        self.retry_after = retry_after
+
+
+# Limited endpoints and the request attributes each one is keyed by. Limits are
+# read from RATELIMIT_<SCOPE>_PER_<DIMENSION> as "<requests>/<seconds>".
+SCOPES = {
+    'login': ('ip', 'username'),
+    'forgot_password': ('ip', 'email')
+}
+
+
+def parse_limit(value):
+    try:
+        count, seconds = value.split('/')
+        count, seconds = int(count), int(seconds)
+    except ValueError:
+        raise ValueError(f'Invalid rate limit {value!r}, expected "<requests>/<seconds>"')
+    if count < 1 or seconds < 1:
+        raise ValueError(f'Invalid rate limit {value!r}')
+    return count, seconds
+
+
+def sliding_window(prev, curr, elapsed, limit, window):
+    """Seconds until one more hit fits under ``limit`` (0 if it fits now).
+
+    The sliding window count is approximated from two fixed windows: the
+    previous window's count weighted by how much of it still overlaps, plus
+    the current window's count.
+    """
+    if prev * (window - elapsed) / window + curr + 1 <= limit:
+        return 0
+    if curr + 1 > limit:
+        # Wait for the next window, where the current count becomes the weighted one
+        wait = (window - elapsed) + (window * (1 - (limit - 1) / curr) if curr else 0)
+    else:
+        wait = (window - elapsed) - (limit - 1 - curr) * window / prev
+    return max(1, math.ceil(wait))
+
+
+class MemoryStore:
+    """Per-process counters, evicting the least recently hit keys beyond ``max_keys``.
+
+    Each hit reads, updates and writes its key's counters under one lock, so
+    concurrent hits on the same key are all counted.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        bucket = int(now // window)
+        with self._lock:
+            state = self._counters.get(key)
+            if state is None or state[0] < bucket - 1:
+                prev, curr = 0, 0
+            elif state[0] == bucket - 1:
+                prev, curr = state[2], 0
+            else:
+                prev, curr = state[1], state[2]
+
+            retry_after = sliding_window(prev, curr, now - bucket * window, limit, window)
+            self._counters[key] = (bucket, prev, curr if retry_after else curr + 1)
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+        return retry_after
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class RedisStore:
+    """Counters shared by every worker through Redis (requires the ``redis`` package)."""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        bucket = int(now // window)
+        curr_key = f'{self.prefix}{key}:{bucket}'
+        pipe = self.client.pipeline()
+        pipe.get(f'{self.prefix}{key}:{bucket - 1}')
+        pipe.incr(curr_key)
+        pipe.expire(curr_key, 2 * window)
+        prev, curr, _ = pipe.execute()
+
+        # curr already includes this hit; undo it when the hit is rejected
+        retry_after = sliding_window(int(prev or 0), curr - 1, now - bucket * window, limit, window)
+        if retry_after:
+            self.client.decr(curr_key)
+        return retry_after
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+
+def create_store(url, max_keys):
+    scheme = urlparse(url).scheme
+    if scheme == 'memory':
+        return MemoryStore(max_keys)
+    if scheme in ('redis', 'rediss', 'unix'):
+        return RedisStore(url)
+    raise ValueError(f'Unsupported RATELIMIT_STORAGE_URL scheme {scheme!r}')
+
+
+class RateLimiter:
+    """Sliding-window limits for unauthenticated, expensive endpoints.
+
+    ``store`` is anything with ``hit(key, limit, window)`` returning the
+    seconds to wait, or 0 when the hit is allowed and counted.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.store = None
+        self.rules = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['RATELIMIT_ENABLED']
+        self.store = create_store(app.config['RATELIMIT_STORAGE_URL'], app.config['RATELIMIT_MEMORY_MAX_KEYS'])
+        self.rules = {
+            scope: [
+                (dimension, *parse_limit(app.config[f'RATELIMIT_{scope.upper()}_PER_{dimension.upper()}']))
+                for dimension in dimensions
+            ]
+            for scope, dimensions in SCOPES.items()
+        }
+        app.extensions['rate_limiter'] = self
+
+    def check(self, scope, **values):
+        """Count a hit against every limit of ``scope``; raise :class:`RateLimited` if one is exhausted."""
+        if not self.enabled:
+            return
+        for dimension, limit, window in self.rules[scope]:
+            value = values.get(dimension)
+            if not value:
+                continue
+            retry_after = self.store.hit(f'{scope}:{dimension}:{value}', limit, window)
+            if retry_after:
+                raise RateLimited(retry_after)
@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from app import db
+from app.models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings; no false negatives, ``error_rate`` false positives."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(capacity, 1)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenBlocklist:
+    """Revoked JWT ids, checked without per-request SQL.
+
+    Every unexpired row of ``revoked_token`` is held in a Bloom filter, so the
+    common case, a token that was never revoked, is answered from memory. A
+    filter hit is confirmed with one indexed lookup. A confirmed revocation is
+    kept in an exact set until the token expires, so repeated use of a revoked
+    token costs no further queries. A false positive is not cached, since
+    another process may revoke that token later. New rows from other
+    processes are picked up every ``sync_interval`` seconds. The filter is
+    rebuilt every ``rebuild_interval`` seconds, or once it is over capacity, to
+    drop expired ids.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001, sync_interval=5, rebuild_interval=3600,
+                 exact_size=10000):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.exact_size = exact_size
+        self._bloom = None
+        self._exact = {}
+        self._seen_id = 0
+        self._synced_id = 0
+        self._next_sync = 0
+        self._next_rebuild = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def is_revoked(self, jti, expires):
+        self.maybe_sync()
+        if jti not in self._bloom:
+            return False
+        if jti in self._exact:
+            return True
+        with db.engine.connect() as connection:
+            revoked = connection.execute(
+                db.select(RevokedToken.id).filter_by(jti=jti)
+            ).first() is not None
+        if revoked:
+            self._remember(jti, expires)
+        return revoked
+
+    def is_known_clear(self, jti):
+        """True if ``jti`` is certainly not revoked, answered from memory alone.
+
+        False means ``is_revoked`` must decide, which may query the database.
+        """
+        return self._bloom is not None and time.monotonic() < self._next_sync and jti not in self._bloom
+
+    def add(self, jti, expires):
+        """Block ``jti`` in this process right away; other processes see it on their next sync."""
+        self._remember(jti, expires)
+        if self._bloom is not None:
+            with self._lock:
+                self._bloom.add(jti)
+
+    def _remember(self, jti, expires):
+        self._exact[jti] = expires
+        if len(self._exact) > self.exact_size:
+            # Dicts keep insertion order, so this drops the oldest entry
+            self._exact.pop(next(iter(self._exact)), None)
+
+    def maybe_sync(self):
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        # Requests wait for the first load; afterwards one request syncs and the rest go on
+        if not self._sync_lock.acquire(blocking=self._bloom is None):
+            return
+        try:
+            if now < self._next_sync:
+                return
+            try:
+                if self._bloom is None or now >= self._next_rebuild:
+                    self.rebuild()
+                else:
+                    self.sync()
+            except Exception:
+                if self._bloom is None:
+                    raise
+                logger.exception('Token blocklist sync failed')
+            self._next_sync = now + self.sync_interval
+        finally:
+            self._sync_lock.release()
+
+    def rebuild(self):
+        with db.engine.connect() as connection:
+            high = connection.execute(db.select(db.func.max(RevokedToken.id))).scalar() or 0
+            jtis = connection.execute(
+                db.select(RevokedToken.jti)
+                .filter(RevokedToken.id <= high, RevokedToken.expires_at > datetime.utcnow())
+            ).scalars().all()
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        with self._lock:
+            # Keep ids revoked in this process since the query began
+            for jti in list(self._exact):
+                bloom.add(jti)
+            self._bloom = bloom
+        self._seen_id = self._synced_id = high
+        self._next_rebuild = time.monotonic() + self.rebuild_interval
+        self._evict_expired()
+
+    def sync(self):
+        # Rows are read again for one more round, to catch transactions that
+        # were given a lower id but committed after the previous sync
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                db.select(RevokedToken.id, RevokedToken.jti).filter(RevokedToken.id > self._synced_id)
+            ).all()
+        with self._lock:
+            for row in rows:
+                self._bloom.add(row.jti)
+        self._synced_id = self._seen_id
+        self._seen_id = max((row.id for row in rows), default=self._seen_id)
+        if self._bloom.count > self._bloom.capacity:
+            self._next_rebuild = 0
+        self._evict_expired()
+
+    def _evict_expired(self):
+        now = time.time()
+        for jti in [jti for jti, expires in list(self._exact.items()) if expires <= now]:
+            self._exact.pop(jti, None)
+
+
+token_blocklist = TokenBlocklist()
+
+
+def revoke_tokens(*tokens):
+    """Persist the decoded ``tokens`` as revoked and block them in this process.
+
+    Tokens that are already revoked are skipped, so revoking one twice (or
+    alongside a token revoked by a concurrent request) never fails the rest.
+    """
+    rows = [{'jti': claims['jti'], 'expires_at': datetime.utcfromtimestamp(claims['exp'])} for claims in tokens]
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        insert = None
+
+    if insert is not None:
+        db.session.execute(insert(RevokedToken).on_conflict_do_nothing(index_elements=['jti']), rows)
+    else:
+        revoked = set(db.session.execute(
+            db.select(RevokedToken.jti).filter(RevokedToken.jti.in_([row['jti'] for row in rows]))
+        ).scalars())
+        rows = [row for row in rows if row['jti'] not in revoked]
+        if rows:
+            db.session.execute(db.insert(RevokedToken), rows)
+    db.session.commit()
+    for claims in tokens:
+        token_blocklist.add(claims['jti'], claims['exp'])
+
+
+def init_blocklist(app):
+    token_blocklist.capacity = app.config['JWT_BLOCKLIST_CAPACITY']
+    token_blocklist.error_rate = app.config['JWT_BLOCKLIST_ERROR_RATE']
+    token_blocklist.sync_interval = app.config['JWT_BLOCKLIST_SYNC_INTERVAL']
+    token_blocklist.rebuild_interval = app.config['JWT_BLOCKLIST_REBUILD_INTERVAL']
+    # Loaded from the database on first use
+    token_blocklist._bloom = None
+    token_blocklist._exact.clear()
+    token_blocklist._next_sync = 0
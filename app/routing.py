@@ -0,0 +1,150 @@
+import itertools
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+
+
+class ReplicaRouter:
+    """Chooses a replica engine and tracks callers that recently wrote.
+
+    The writers known here are only those of this process. So that the next
+    request sees the write whichever worker serves it, the caller also gets a
+    signed cookie naming them, valid for the sticky window (see
+    ``sticky_identity``).
+    """
+
+    def __init__(self):
+        self._counter = itertools.count()
+        self._recent_writers = {}
+        self._lock = threading.Lock()
+
+    def choose(self, engines, strategy):
+        if strategy == 'least_connections':
+            return min(engines, key=lambda engine: engine.pool.checkedout())
+        return engines[next(self._counter) % len(engines)]
+
+    def mark_write(self, identity, window):
+        with self._lock:
+            self._recent_writers[identity] = time.monotonic() + window
+            if len(self._recent_writers) > 10000:
+                now = time.monotonic()
+                self._recent_writers = {k: v for k, v in self._recent_writers.items() if v > now}
+
+    def wrote_recently(self, identity):
+        expires = self._recent_writers.get(identity)
+        return expires is not None and expires > time.monotonic()
+
+
+router = ReplicaRouter()
+
+
+def read_only(fn):
+    """Mark a view as read-only so its queries may be served by a replica.
+
+    Apply it inside the authorization decorator: token checks then run on the
+    primary (usually from the claims cache) and the caller's identity is known
+    when the replica is chosen.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def _sticky_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='db-replica-sticky')
+
+
+def sticky_identity(value=None):
+    """The caller named by a valid, unexpired sticky cookie (by default the request's), if any."""
+    if value is None:
+        value = request.cookies.get(current_app.config['DB_REPLICA_STICKY_COOKIE'])
+    if not value:
+        return None
+    try:
+        return _sticky_serializer().loads(value, max_age=current_app.config['DB_REPLICA_STICKY_SECONDS'])
+    except BadSignature:
+        return None
+
+
+def set_sticky_cookie(response):
+    identity = g.pop('_db_wrote', None)
+    if identity is not None:
+        response.set_cookie(
+            current_app.config['DB_REPLICA_STICKY_COOKIE'], _sticky_serializer().dumps(identity),
+            max_age=current_app.config['DB_REPLICA_STICKY_SECONDS'], httponly=True, secure=request.is_secure,
+            samesite='Lax'
+        )
+    return response
+
+
+def init_routing(app):
+    if app.config['SQLALCHEMY_BINDS']:
+        app.after_request(set_sticky_cookie)
+
+
+def _caller_identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+class RoutingSession(Session):
+    """Sends reads from read-only requests to a replica.
+
+    Writes, flushes and anything outside a read-only request use the primary.
+    A caller who committed a write within ``DB_REPLICA_STICKY_SECONDS``, as
+    known to this process or shown by their sticky cookie, keeps reading from
+    the primary so they see their own changes. Flushes and
+    ``UPDATE``/``DELETE``/``INSERT`` statements run through ``execute`` both
+    count as writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or self._flushing or not has_request_context() or not g.get('db_read_only'):
+            return engine
+        if clause is not None and getattr(clause, 'is_dml', False):
+            return engine
+
+        engines = self._db.engines
+        if engine is not engines.get(None):
+            return engine
+
+        if '_db_replica' not in g:
+            replicas = [engines[key] for key in current_app.config['SQLALCHEMY_BINDS'] if key.startswith('replica_')]
+            identity = _caller_identity()
+            if not replicas or (identity is not None and (router.wrote_recently(identity)
+                                                          or sticky_identity() == identity)):
+                g._db_replica = None
+            else:
+                g._db_replica = router.choose(replicas, current_app.config['DB_REPLICA_SELECTION'])
+        return g._db_replica or engine
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _record_flush(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _record_statement(orm_execute_state):
+    # Bulk and Core-style DML bypasses the flush, so mark it here
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _record_write(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        identity = _caller_identity()
+        if identity is not None:
+            router.mark_write(identity, current_app.config['DB_REPLICA_STICKY_SECONDS'])
+            g._db_wrote = identity
@@ -0,0 +1,99 @@
+import json
+from datetime import date, datetime
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from flask_restx import fields
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Per-type conversions matching what flask_restx fields produce for non-null values
+_CONVERTERS = {
+    fields.Integer: 'int({})',
+    fields.Float: 'float({})',
+    fields.String: 'str({})',
+    fields.Boolean: 'bool({})',
+    fields.DateTime: '{}.isoformat()',
+    fields.Date: '{}.isoformat()',
+    fields.Raw: '{}'
+}
+
+
+def _converter(field):
+    for field_type in type(field).__mro__:
+        if field_type in _CONVERTERS:
+            return _CONVERTERS[field_type]
+    raise TypeError(f'Cannot compile field type {type(field).__name__}')
+
+
+def compile_serializer(model, names=None):
+    """Build a function turning a column tuple (in ``names`` order) into a dict for ``model``."""
+    names = list(model) if names is None else list(names)
+    lines = ['def serialize(row):']
+    items = []
+    for i, name in enumerate(names):
+        field = model[name]
+        if isinstance(field, type):
+            field = field()
+        value = f'row[{i}]'
+        conversion = _converter(field).format(value)
+        if conversion != value:
+            lines.append(f'    v{i} = {value}')
+            value = f'v{i}'
+            conversion = f'None if {value} is None else {_converter(field).format(value)}'
+        items.append(f'{name!r}: {conversion}')
+    lines.append(f"    return {{{', '.join(items)}}}")
+
+    namespace = {}
+    exec(compile('\n'.join(lines), f'<serializer {model.name}>', 'exec'), namespace)
+    serialize = namespace['serialize']
+    serialize.names = names
+    return serialize
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps_bytes(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, separators=(',', ':'), default=_default).encode()
+
+
+def json_response(data, status=200, headers=None):
+    return current_app.response_class(dumps_bytes(data), status=status, headers=headers,
+                                      mimetype='application/json')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def _option(self, indent=False):
+        # Datetimes still go through Flask's default (HTTP date) formatting
+        option = orjson.OPT_PASSTHROUGH_DATETIME | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        return option | orjson.OPT_INDENT_2 if indent else option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._option()).decode()
+
+    def response(self, *args, **kwargs):
+        # jsonify() and dict returns; encoded straight to bytes, pretty-printed like Flask in debug
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = orjson.dumps(obj, default=self.default, option=self._option(indent)) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def init_json(app):
+    if orjson is not None and app.config['JSON_USE_ORJSON']:
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,252 @@
+"""Streaming bulk export and import of users (``python run.py users export|import``).
+
+PostgreSQL moves CSV through ``COPY``; other engines, and NDJSON, go through
+batched statements. Either way only one batch of rows is held in memory.
+"""
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from flask_restx import Model, fields
+from app import db, hasher
+from app.models import User
+from app.validation import PayloadValidator, check_email, check_password, check_username
+
+EXPORT_COLUMNS = ['id', 'username', 'email', 'first_name', 'last_name', 'role', 'is_active',
+                  'created_at', 'updated_at']
+IMPORT_COLUMNS = ['username', 'email', 'first_name', 'last_name', 'password_hash', 'role', 'is_active',
+                  'created_at', 'updated_at']
+
+# The same rules as registration; a password_hash is stored as is, a password must meet the policy
+import_model = Model('UserImport', {
+    'username': fields.String(required=True, max_length=64),
+    'email': fields.String(required=True, max_length=120),
+    'first_name': fields.String(required=True, max_length=64),
+    'last_name': fields.String(required=True, max_length=64),
+    'password': fields.String,
+    'password_hash': fields.String(max_length=255),
+    'role': fields.String(enum=['Admin', 'User'])
+})
+import_validator = PayloadValidator(import_model, checks={
+    'username': check_username,
+    'email': check_email,
+    'password': check_password
+})
+
+
+class Progress:
+    def __init__(self, report, every):
+        self.report = report
+        self.every = every
+        self.count = 0
+        self.started = time.perf_counter()
+        self._next = every
+
+    def add(self, count):
+        self.count += count
+        if self.report and self.count >= self._next:
+            self._next = self.count + self.every
+            self.report(self.count, time.perf_counter() - self.started)
+
+    def done(self):
+        return self.count, time.perf_counter() - self.started
+
+
+def is_postgresql():
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def export_users(out, fmt='csv', include_password_hash=False, batch_size=10000, report=None):
+    """Write every user to the binary file ``out``; returns (rows, seconds)."""
+    columns = EXPORT_COLUMNS + (['password_hash'] if include_password_hash else [])
+    progress = Progress(report, batch_size)
+    if fmt == 'csv' and is_postgresql():
+        _copy_out(out, columns, progress)
+        return progress.done()
+
+    query = db.select(*[getattr(User, name) for name in columns]).order_by(User.id)
+    # Server-side cursor: rows arrive batch_size at a time
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text)
+    if fmt == 'csv':
+        writer.writerow(columns)
+    for rows in result.partitions():
+        if fmt == 'csv':
+            writer.writerows(
+                [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+            )
+        else:
+            text.write(''.join(
+                json.dumps(dict(zip(columns, row)), default=datetime.isoformat) + '\n' for row in rows
+            ))
+        progress.add(len(rows))
+    text.detach()
+    return progress.done()
+
+
+class _CountingWriter:
+    """Counts lines as COPY streams them, for progress reporting."""
+
+    def __init__(self, out, progress):
+        self.out = out
+        self.progress = progress
+
+    def write(self, data):
+        self.out.write(data)
+        self.progress.add(data.count(b'\n') if isinstance(data, bytes) else data.count('\n'))
+
+
+def _copy_out(out, columns, progress):
+    column_list = ', '.join(columns)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        writer = _CountingWriter(out, progress)
+        cursor.copy_expert(
+            f'COPY (SELECT {column_list} FROM "user" ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER true)', writer
+        )
+        # The header line was counted as a row
+        progress.count -= 1
+    finally:
+        cursor.close()
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    else:
+        for line in io.TextIOWrapper(stream, encoding='utf-8'):
+            if line.strip():
+                yield json.loads(line)
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('t', 'true', '1', 'yes', 'on')
+
+
+def _timestamp(value, default):
+    if not value:
+        return default
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def prepare_batch(items, now):
+    """Validate and normalize a batch of input rows; passwords without a hash are hashed across the worker pool."""
+    rows, errors, plain = [], [], []
+    for number, item in items:
+        data, problems = import_validator.check(item)
+        if problems:
+            errors.append((number, '; '.join(problems.values())))
+            continue
+        if not data.get('password_hash') and not data.get('password'):
+            errors.append((number, 'missing password or password_hash'))
+            continue
+        try:
+            created_at = _timestamp(item.get('created_at'), now)
+            updated_at = _timestamp(item.get('updated_at'), created_at)
+        except ValueError as e:
+            errors.append((number, str(e)))
+            continue
+        row = {
+            'username': data['username'],
+            'email': data['email'],
+            'first_name': data['first_name'],
+            'last_name': data['last_name'],
+            'password_hash': data.get('password_hash'),
+            'role': data.get('role') or 'User',
+            'is_active': _flag(item['is_active']) if item.get('is_active') not in (None, '') else True,
+            'created_at': created_at,
+            'updated_at': updated_at
+        }
+        if not row['password_hash']:
+            plain.append((row, data['password']))
+        rows.append(row)
+
+    if plain:
+        for (row, _), pwhash in zip(plain, hasher.hash_many([password for _, password in plain])):
+            row['password_hash'] = pwhash
+    return rows, errors
+
+
+def _batches(rows, size):
+    batch = []
+    for number, item in enumerate(rows, start=1):
+        batch.append((number, item))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_users(stream, fmt='csv', batch_size=10000, report=None, on_error=None):
+    """Insert users from the binary file ``stream``, skipping existing usernames/emails.
+
+    Returns (inserted, skipped, invalid, seconds).
+    """
+    progress = Progress(report, batch_size)
+    invalid = 0
+    now = datetime.utcnow()
+    postgresql = is_postgresql()
+    if postgresql:
+        _create_staging_table()
+
+    inserted = 0
+    for batch in _batches(read_rows(stream, fmt), batch_size):
+        rows, errors = prepare_batch(batch, now)
+        invalid += len(errors)
+        for number, message in errors:
+            if on_error:
+                on_error(number, message)
+        if rows:
+            if postgresql:
+                _copy_in(rows)
+            else:
+                from app.api.auth import insert_ignoring_conflicts
+                inserted += len(insert_ignoring_conflicts(rows))
+                db.session.commit()
+        progress.add(len(batch))
+
+    if postgresql:
+        inserted = _merge_staging_table()
+        db.session.commit()
+    total, seconds = progress.done()
+    return inserted, total - invalid - inserted, invalid, seconds
+
+
+def _create_staging_table():
+    db.session.execute(db.text(
+        'CREATE TEMPORARY TABLE user_import ('
+        'username text, email text, first_name text, last_name text, password_hash text, '
+        'role text, is_active boolean, created_at timestamp, updated_at timestamp'
+        ') ON COMMIT DROP'
+    ))
+
+
+def _copy_in(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [row[name].isoformat() if isinstance(row[name], datetime) else row[name] for name in IMPORT_COLUMNS]
+        for row in rows
+    )
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY user_import ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _merge_staging_table():
+    # One set-based insert from the staging table; rows that collide are skipped
+    column_list = ', '.join(IMPORT_COLUMNS)
+    result = db.session.execute(db.text(
+        f'INSERT INTO "user" ({column_list}, token_version) '
+        f'SELECT username, email, first_name, last_name, password_hash, '
+        f'role::user_roles, is_active, created_at, updated_at, 0 FROM user_import '
+        f'ON CONFLICT DO NOTHING'
+    ))
+    return result.rowcount
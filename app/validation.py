@@ -0,0 +1,159 @@
+import re
+from flask import current_app, request
+from flask_restx import abort, fields
+
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$')
+USERNAME_RE = re.compile(r'^[a-zA-Z0-9_.-]+$')
+
+_TYPES = (
+    (fields.String, str, 'a string'),
+    (fields.Boolean, bool, 'a boolean'),
+    (fields.Integer, int, 'an integer'),
+    (fields.Float, (int, float), 'a number'),
+    (fields.List, list, 'a list')
+)
+
+
+class PasswordPolicy:
+    """Password rules compiled into a single regular expression."""
+
+    def __init__(self, min_length=8, max_length=128, require_digit=True, require_upper=True,
+                 require_lower=True, special_characters='@$!%*?&#'):
+        self.max_length = max_length
+        lookaheads, requirements = [], []
+        if require_digit:
+            lookaheads.append('(?=[^0-9]*[0-9])')
+            requirements.append('numbers')
+        if require_upper:
+            lookaheads.append('(?=[^A-Z]*[A-Z])')
+            requirements.append('uppercase letters')
+        if require_lower:
+            lookaheads.append('(?=[^a-z]*[a-z])')
+            requirements.append('lowercase letters')
+        if special_characters:
+            special = re.escape(special_characters)
+            lookaheads.append(f'(?=[^{special}]*[{special}])')
+            requirements.append(f'special characters ({special_characters})')
+        self.pattern = re.compile(''.join(lookaheads) + f'.{{{min_length},{max_length}}}\\Z', re.DOTALL)
+
+        self.message = f'Password must be between {min_length} and {max_length} characters long'
+        if requirements:
+            listed = ', '.join(requirements[:-1]) + (' and ' if len(requirements) > 1 else '') + requirements[-1]
+            self.message += f' and contain {listed}'
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            min_length=config['PASSWORD_MIN_LENGTH'],
+            max_length=config['PASSWORD_MAX_LENGTH'],
+            require_digit=config['PASSWORD_REQUIRE_DIGIT'],
+            require_upper=config['PASSWORD_REQUIRE_UPPERCASE'],
+            require_lower=config['PASSWORD_REQUIRE_LOWERCASE'],
+            special_characters=config['PASSWORD_SPECIAL_CHARACTERS']
+        )
+
+    def check(self, password):
+        return None if self.pattern.match(password) else self.message
+
+
+def password_policy():
+    return current_app.extensions['password_policy']
+
+
+def check_email(value):
+    return None if EMAIL_RE.match(value) else 'Invalid email address'
+
+
+def check_username(value):
+    if USERNAME_RE.match(value):
+        return None
+    return 'Username can only contain letters, numbers, underscores, hyphens, and periods'
+
+
+def check_ids(value):
+    if all(isinstance(item, int) and not isinstance(item, bool) for item in value):
+        return None
+    return 'ids must be a list of integers'
+
+
+def check_password(value):
+    return password_policy().check(value)
+
+
+def check_password_length(value):
+    # Bounds KDF work for passwords that are only verified, not set
+    max_length = password_policy().max_length
+    return None if len(value) <= max_length else f'Password must be at most {max_length} characters long'
+
+
+class PayloadValidator:
+    """Validates and normalises a JSON object against an ``api.model``.
+
+    The model's fields are compiled once into a plan of type, length, pattern
+    and choice checks (taken from ``required``, ``min_length``, ``max_length``,
+    ``pattern`` and ``enum``), plus an optional check function per field. Read-only
+    fields are skipped and unknown keys are dropped. Every field is checked
+    in one pass, and all errors are reported together.
+    """
+
+    def __init__(self, model, checks=None, strip=True):
+        self.model = model
+        self.strip = strip
+        checks = checks or {}
+        self.plan = []
+        for name, field in model.items():
+            if isinstance(field, type):
+                field = field()
+            if getattr(field, 'readonly', False):
+                continue
+            kind, kind_name = next(((t, n) for cls, t, n in _TYPES if isinstance(field, cls)), (None, None))
+            pattern = getattr(field, 'pattern', None)
+            self.plan.append((
+                name, kind, kind_name, field.required,
+                getattr(field, 'min_length', None), getattr(field, 'max_length', None),
+                re.compile(pattern) if pattern else None, getattr(field, 'enum', None) or None, checks.get(name)
+            ))
+
+    def check(self, payload):
+        """Return ``(data, errors)``; ``errors`` maps field names to messages."""
+        if not isinstance(payload, dict):
+            return None, {'payload': 'Expected a JSON object'}
+        data, errors = {}, {}
+        for name, kind, kind_name, required, min_length, max_length, pattern, enum, check in self.plan:
+            value = payload.get(name)
+            if self.strip and isinstance(value, str):
+                value = value.strip()
+            if value is None or value == '':
+                if required:
+                    errors[name] = f'{name} is required and cannot be empty'
+                continue
+            if kind is not None and (not isinstance(value, kind) or (kind is not bool and isinstance(value, bool))):
+                errors[name] = f'{name} must be {kind_name}'
+                continue
+            if max_length is not None and len(value) > max_length:
+                errors[name] = f'{name} must be at most {max_length} characters long'
+            elif min_length is not None and len(value) < min_length:
+                errors[name] = f'{name} must be at least {min_length} characters long'
+            elif pattern is not None and not pattern.match(value):
+                errors[name] = f'{name} has an invalid format'
+            elif enum is not None and value not in enum:
+                errors[name] = f"{name} must be one of {', '.join(enum)}"
+            elif check is not None and (message := check(value)):
+                errors[name] = message
+            else:
+                data[name] = value
+        return data, errors
+
+    def validate(self):
+        """Validate the request body, aborting with 400 and every field error on failure."""
+        payload = request.get_json(silent=True)
+        if payload is None:
+            abort(400, 'Request body must be a JSON object')
+        data, errors = self.check(payload)
+        if errors:
+            abort(400, 'Input payload validation failed', errors=errors)
+        return data
+
+
+def init_validation(app):
+    app.extensions['password_policy'] = PasswordPolicy.from_config(app.config)
@@ -0,0 +1,68 @@
+import atexit
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """Daemon thread that calls ``run_once`` in an app context.
+
+    The thread runs every ``interval`` seconds, or as soon as ``wake`` is
+    called. It is started lazily by ``ensure_started``, once per process,
+    and stopped at interpreter exit.
+    """
+
+    name = 'worker'
+    interval = 5
+    stop_timeout = 5
+
+    def __init__(self):
+        self.app = None
+        self._thread = None
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def wake(self):
+        self._wakeup.set()
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def ensure_started(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(self.stop_timeout if timeout is None else timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception:
+                logger.exception('Background worker %s failed', self.name)
@@ -0,0 +1,362 @@
+"""Offline load test and micro-benchmark for the API.
+
+Seeds N users into a throwaway database (SQLite by default, or any URL passed
+with --database), runs a scripted mix of requests through the Flask test
+client or a real WSGI server, and prints throughput, latency percentiles and
+SQL statement counts as JSON.
+
+    python benchmarks/bench.py --users 10000 --requests 2000
+    python benchmarks/bench.py --server wsgi --concurrency 8 --output current.json
+    python benchmarks/bench.py --server asgi --concurrency 32
+    python benchmarks/bench.py --baseline baseline.json --threshold 15
+"""
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from sqlalchemy.pool import Pool  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import User  # noqa: E402
+from config import Config  # noqa: E402
+
+PASSWORD = 'BenchP@ssw0rd'
+DEFAULT_MIX = 'login=1,list=5,get=20,update=3,reset=1'
+
+
+def make_config(database_url, hash_method):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SECRET_KEY = 'bench'
+        JWT_SECRET_KEY = 'bench-jwt-secret-key-of-sufficient-length'
+        MAIL_BACKEND = 'memory'
+        MAIL_QUEUE_ENABLED = False
+        MAIL_DEFAULT_SENDER = 'bench@example.com'
+        PASSWORD_HASH_METHOD = hash_method
+        AUTO_CREATE_DATABASE = False
+        # A load test is one client hammering login; it would trip the brute-force limits
+        RATELIMIT_ENABLED = False
+        METRICS_SLOW_REQUEST_MS = 0
+    return BenchConfig
+
+
+def seed(app, count, hash_method, chunk_size=10000):
+    pwhash = generate_password_hash(PASSWORD, hash_method)
+    now = datetime.utcnow()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for start in range(0, count, chunk_size):
+            rows = [{
+                'username': f'user{i}',
+                'email': f'user{i}@example.com',
+                'first_name': 'Bench',
+                'last_name': f'User{i}',
+                'password_hash': pwhash,
+                'role': 'Admin' if i == 0 else 'User',
+                'is_active': True,
+                'created_at': now,
+                'updated_at': now
+            } for i in range(start, min(start + chunk_size, count))]
+            db.session.execute(db.insert(User), rows)
+            db.session.commit()
+
+
+class ConnectionCounter:
+    """Connections opened, and the most checked out at once, across every pool."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.checked_out = 0
+        self.peak = 0
+        event.listen(Pool, 'connect', self.connect)
+        event.listen(Pool, 'checkout', self.checkout)
+        event.listen(Pool, 'checkin', self.checkin)
+
+    def connect(self, *args):
+        with self.lock:
+            self.opened += 1
+
+    def checkout(self, *args):
+        with self.lock:
+            self.checked_out += 1
+            self.peak = max(self.peak, self.checked_out)
+
+    def checkin(self, *args):
+        with self.lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers or {})
+        return response.status_code, response.get_data()
+
+
+class WSGITransport:
+    """Serves the app with werkzeug's threaded server on a free local port."""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.local = threading.local()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def request(self, method, path, body=None, headers=None):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection('127.0.0.1', self.port)
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def close(self):
+        self.server.shutdown()
+
+
+class ASGITransport(WSGITransport):
+    """Serves the app through app.asgi under uvicorn (requires a2wsgi and uvicorn)."""
+
+    def __init__(self, app):
+        import socket
+        import uvicorn
+        from app.asgi import create_asgi_app
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.port = sock.getsockname()[1]
+        config = uvicorn.Config(create_asgi_app(app), log_level='error', lifespan='on')
+        self.server = uvicorn.Server(config)
+        self.local = threading.local()
+        self.thread = threading.Thread(target=self.server.run, kwargs={'sockets': [sock]}, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def close(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def build_operations(user_count, admin_headers):
+    def login():
+        i = random.randrange(user_count)
+        return 'POST', '/auth/login', {'username': f'user{i}', 'password': PASSWORD}, None
+
+    def list_users():
+        return 'GET', '/users/?limit=100', None, admin_headers
+
+    def get_user():
+        return 'GET', f'/users/{random.randrange(user_count) + 1}', None, admin_headers
+
+    def update_user():
+        i = random.randrange(1, user_count)
+        body = {'username': f'user{i}', 'email': f'user{i}@example.com', 'first_name': 'Bench',
+                'last_name': f'User{i}', 'role': 'User', 'is_active': True}
+        return 'PUT', f'/users/{i + 1}', body, admin_headers
+
+    def reset():
+        return 'POST', '/auth/forgot-password', {'email': f'user{random.randrange(user_count)}@example.com'}, None
+
+    return {'login': login, 'list': list_users, 'get': get_user, 'update': update_user, 'reset': reset}
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed):
+    latencies = [s['latency'] for s in samples]
+    queries = [s['queries'] for s in samples if s['queries'] is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for s in samples if not 200 <= s['status'] < 300),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def run(args):
+    database_url = args.database
+    tmpdir = None
+    if database_url is None:
+        tmpdir = tempfile.mkdtemp(prefix='bench-')
+        database_url = f'sqlite:///{os.path.join(tmpdir, "bench.db")}'
+
+    app = create_app(make_config(database_url, args.hash_method))
+    seed_start = time.perf_counter()
+    seed(app, args.users, args.hash_method)
+    seed_seconds = time.perf_counter() - seed_start
+
+    # Listening on the classes also covers the async engines of the ASGI mode
+    statement_count = [0]
+    event.listen(Engine, 'before_cursor_execute', lambda *a: statement_count.__setitem__(0, statement_count[0] + 1))
+    connections = ConnectionCounter()
+
+    transports = {'wsgi': WSGITransport, 'asgi': ASGITransport, 'testclient': TestClientTransport}
+    transport = transports[args.server](app)
+    status, body = transport.request('POST', '/auth/login', {'username': 'user0', 'password': PASSWORD})
+    if status != 200:
+        raise SystemExit(f'Admin login failed: {status} {body[:200]}')
+    admin_headers = {'Authorization': f'Bearer {json.loads(body)["access_token"]}'}
+
+    operations = build_operations(args.users, admin_headers)
+    weights = parse_mix(args.mix)
+    unknown = set(weights) - set(operations)
+    if unknown:
+        raise SystemExit(f'Unknown operations in mix: {", ".join(sorted(unknown))}')
+    names = list(weights)
+    rng = random.Random(args.seed)
+    plan = rng.choices(names, weights=[weights[n] for n in names], k=args.requests)
+    random.seed(args.seed)
+
+    # Per-request statement counts are only exact when requests do not overlap
+    exact_queries = args.concurrency == 1
+    samples = []
+    lock = threading.Lock()
+
+    def worker(items):
+        for name in items:
+            method, path, body, headers = operations[name]()
+            before = statement_count[0]
+            start = time.perf_counter()
+            status, _ = transport.request(method, path, body, headers)
+            latency = time.perf_counter() - start
+            queries = statement_count[0] - before if exact_queries else None
+            with lock:
+                samples.append({'op': name, 'status': status, 'latency': latency, 'queries': queries})
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(plan[i::args.concurrency],)) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if isinstance(transport, WSGITransport):
+        transport.close()
+
+    # Connections needed for the throughput reached, to compare server modes
+
+    report = {
+        'config': {
+            'users': args.users, 'requests': args.requests, 'mix': args.mix, 'server': args.server,
+            'concurrency': args.concurrency, 'database': database_url.split('@')[-1],
+            'hash_method': args.hash_method, 'seed_seconds': round(seed_seconds, 2),
+        },
+        'overall': summarize(samples, elapsed),
+        'db_connections': {
+            'peak_checked_out': connections.peak,
+            'opened': connections.opened,
+        },
+        'operations': {name: summarize([s for s in samples if s['op'] == name], elapsed) for name in names},
+    }
+    peak = report['db_connections']['peak_checked_out']
+    if peak and report['overall']['throughput_rps']:
+        report['db_connections']['rps_per_connection'] = round(report['overall']['throughput_rps'] / peak, 2)
+    if not exact_queries:
+        report['overall']['queries_per_request'] = round(statement_count[0] / max(len(samples), 1), 2)
+    return report
+
+
+def compare(report, baseline, threshold):
+    """Return a list of regressions beyond ``threshold`` percent against ``baseline``.
+
+    Any non-2xx response is a failure on its own: a request that fails fast
+    would otherwise look like an improvement.
+    """
+    failures = []
+    for name, current in report['operations'].items():
+        if current['errors']:
+            failures.append(f'{name}.errors: {current["errors"]} of {current["requests"]} requests were not 2xx')
+        previous = baseline.get('operations', {}).get(name)
+        if not previous:
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request'):
+            if previous.get(key) and current.get(key) is not None:
+                change = (current[key] - previous[key]) / previous[key] * 100
+                if change > threshold:
+                    failures.append(f'{name}.{key}: {previous[key]} -> {current[key]} (+{change:.1f}%)')
+        if previous.get('throughput_rps') and current.get('throughput_rps'):
+            change = (previous['throughput_rps'] - current['throughput_rps']) / previous['throughput_rps'] * 100
+            if change > threshold:
+                failures.append(f'{name}.throughput_rps: {previous["throughput_rps"]} -> '
+                                f'{current["throughput_rps"]} (-{change:.1f}%)')
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='users to seed (default 1000)')
+    parser.add_argument('--requests', type=int, default=1000, help='requests to issue (default 1000)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'weighted operation mix (default {DEFAULT_MIX})')
+    parser.add_argument('--server', choices=('testclient', 'wsgi', 'asgi'), default='testclient',
+                        help='asgi runs app.asgi under uvicorn (pip install a2wsgi uvicorn)')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads (wsgi and asgi servers only)')
+    parser.add_argument('--database', help='database URL; defaults to a temporary SQLite file')
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1000',
+                        help='password hash method for seeded users and the app')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the request plan')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--baseline', help='compare against a saved report and fail on regressions')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed regression in percent (default 10)')
+    args = parser.parse_args(argv)
+    if args.server == 'testclient':
+        args.concurrency = 1
+
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(report, json.load(f), args.threshold)
+        if failures:
+            print('Regressions beyond threshold:\n  ' + '\n  '.join(failures), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
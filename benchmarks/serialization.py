@@ -0,0 +1,77 @@
+"""Micro-benchmark for user list serialization.
+
+Compares flask_restx marshalling of ORM objects plus stdlib json (the old
+list path) with the compiled serializer over column tuples, encoded with the
+stdlib and, when installed, orjson. No database is needed; rows are built in
+memory. Prints timings per configuration as JSON.
+
+    python benchmarks/serialization.py --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_restx import marshal  # noqa: E402
+
+from app import serializers  # noqa: E402
+from app.api.users import user_model, user_serializer  # noqa: E402
+from app.models import User  # noqa: E402
+
+
+def build_rows(count):
+    created = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    users, rows = [], []
+    for i in range(count):
+        values = (i + 1, f'user{i}', f'user{i}@example.com', 'First', 'Last',
+                  'User', True, created + timedelta(seconds=i), created + timedelta(seconds=i, minutes=5))
+        users.append(User(**dict(zip(user_model, values))))
+        rows.append(values)
+    return users, rows
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), len(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000, help='Users per response (default: 10000)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per configuration; the best is reported')
+    args = parser.parse_args(argv)
+
+    users, rows = build_rows(args.rows)
+    serialize = user_serializer(tuple(user_model))
+
+    def compiled_stdlib():
+        return json.dumps([serialize(row) for row in rows], separators=(',', ':')).encode()
+
+    cases = {
+        'marshal+json': lambda: json.dumps(marshal(users, user_model)).encode(),
+        'compiled+json': compiled_stdlib
+    }
+    if serializers.orjson is not None:
+        cases['compiled+orjson'] = lambda: serializers.orjson.dumps([serialize(row) for row in rows])
+
+    results = {}
+    for name, fn in cases.items():
+        seconds, size = best_of(args.repeat, fn)
+        results[name] = {'ms': round(seconds * 1000, 2), 'rows_per_s': round(args.rows / seconds), 'bytes': size}
+    baseline = results['marshal+json']['ms']
+    for result in results.values():
+        result['speedup'] = round(baseline / result['ms'], 2)
+
+    print(json.dumps({'rows': args.rows, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
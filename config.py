@@ -1,14 +1,121 @@
 import os
 from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool
 
 load_dotenv()
 
+def env_flag(name, default):
+    return os.environ.get(name, default).lower() in ['true', 'on', '1']
+
+def engine_options(pool_size, max_overflow):
+    if env_flag('DB_USE_PGBOUNCER', 'false'):
+        # pgbouncer in transaction mode does the pooling; connections must not
+        # be held across transactions or rely on session state such as
+        # prepared statements, so open one per checkout
+        return {'poolclass': NullPool, 'pool_pre_ping': False}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', max_overflow)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),  # seconds
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # seconds
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', 'true'),
+    }
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=5)
+    DB_POOL_SLOW_CHECKOUT_MS = int(os.environ.get('DB_POOL_SLOW_CHECKOUT_MS', 100))
+
+    # Read replicas (comma-separated URLs) serve read-only requests
+    DB_REPLICA_URLS = [url for url in os.environ.get('DB_REPLICA_URLS', '').split(',') if url]
+    SQLALCHEMY_BINDS = {f'replica_{i}': url for i, url in enumerate(DB_REPLICA_URLS)}
+    DB_REPLICA_SELECTION = os.environ.get('DB_REPLICA_SELECTION', 'round_robin')  # or 'least_connections'
+    DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+    # Signed cookie carrying the sticky window to whichever worker serves the next request
+    DB_REPLICA_STICKY_COOKIE = os.environ.get('DB_REPLICA_STICKY_COOKIE', 'db_sticky')
+
+    # Create the database and tables on startup; production uses `init_db`/migrations instead
+    AUTO_CREATE_DATABASE = env_flag('AUTO_CREATE_DATABASE', 'true')
+    STARTUP_TIME_BUDGET_MS = int(os.environ.get('STARTUP_TIME_BUDGET_MS', 500))
+
+    # Prometheus metrics at /metrics; requests slower than this are logged with their SQL (0 disables)
+    METRICS_ENABLED = env_flag('METRICS_ENABLED', 'true')
+    METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS', 1000))
+
+    # Request threads in ASGI mode (asgi.py); 0 sizes them to the database pool
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 0))
+    # Serve login and GET /users/<id> with async handlers on their own async engine
+    ASGI_ASYNC_ROUTES = env_flag('ASGI_ASYNC_ROUTES', 'true')
+    # Defaults to DATABASE_URL with the driver swapped for asyncpg (or aiosqlite)
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+
+    # Audit events are buffered in memory and written in batches by a background thread
+    AUDIT_ENABLED = env_flag('AUDIT_ENABLED', 'true')
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))  # seconds
+    AUDIT_MAX_BUFFER = int(os.environ.get('AUDIT_MAX_BUFFER', 50000))
+    AUDIT_PAGE_DEFAULT_LIMIT = int(os.environ.get('AUDIT_PAGE_DEFAULT_LIMIT', 100))
+    AUDIT_PAGE_MAX_LIMIT = int(os.environ.get('AUDIT_PAGE_MAX_LIMIT', 1000))
+
+    # Swagger UI at /; swagger.json is built once (or read from API_SPEC_FILE, see `run.py spec`)
+    API_DOC_ENABLED = env_flag('API_DOC_ENABLED', 'true')
+    API_SPEC_FILE = os.environ.get('API_SPEC_FILE')
+    API_SPEC_MAX_AGE = int(os.environ.get('API_SPEC_MAX_AGE', 300))  # seconds
+
+    # Encode JSON with orjson when it is installed
+    JSON_USE_ORJSON = env_flag('JSON_USE_ORJSON', 'true')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
     JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 hour
+    JWT_REFRESH_TOKEN_EXPIRES = int(os.environ.get('JWT_REFRESH_TOKEN_EXPIRES', 30 * 24 * 3600))  # seconds
+
+    # Tokens revoked by logout are kept in memory as a Bloom filter of the revoked_token table
+    JWT_BLOCKLIST_CAPACITY = int(os.environ.get('JWT_BLOCKLIST_CAPACITY', 100000))
+    JWT_BLOCKLIST_ERROR_RATE = float(os.environ.get('JWT_BLOCKLIST_ERROR_RATE', 0.001))
+    JWT_BLOCKLIST_SYNC_INTERVAL = float(os.environ.get('JWT_BLOCKLIST_SYNC_INTERVAL', 5))  # seconds
+    JWT_BLOCKLIST_REBUILD_INTERVAL = int(os.environ.get('JWT_BLOCKLIST_REBUILD_INTERVAL', 3600))  # seconds
+
+    # Password hashing (werkzeug method string, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_SALT_LENGTH = int(os.environ.get('PASSWORD_HASH_SALT_LENGTH', 16))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 4 * (os.cpu_count() or 1)))
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))  # seconds
+    PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 1))  # seconds
+
+    # Password policy for registration, reset and change; passwords are bounded to limit KDF work
+    PASSWORD_MIN_LENGTH = int(os.environ.get('PASSWORD_MIN_LENGTH', 8))
+    PASSWORD_MAX_LENGTH = int(os.environ.get('PASSWORD_MAX_LENGTH', 128))
+    PASSWORD_REQUIRE_DIGIT = env_flag('PASSWORD_REQUIRE_DIGIT', 'true')
+    PASSWORD_REQUIRE_UPPERCASE = env_flag('PASSWORD_REQUIRE_UPPERCASE', 'true')
+    PASSWORD_REQUIRE_LOWERCASE = env_flag('PASSWORD_REQUIRE_LOWERCASE', 'true')
+    PASSWORD_SPECIAL_CHARACTERS = os.environ.get('PASSWORD_SPECIAL_CHARACTERS', '@$!%*?&#')
+
+    # Request bodies larger than this are rejected with 413 before they are read
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+
+    # Bulk registration
+    AUTH_BULK_REGISTER_MAX_ITEMS = int(os.environ.get('AUTH_BULK_REGISTER_MAX_ITEMS', 50000))
+    AUTH_BULK_REGISTER_CHUNK_SIZE = int(os.environ.get('AUTH_BULK_REGISTER_CHUNK_SIZE', 1000))
+
+    # Sliding-window rate limits for login and password reset, as "<requests>/<seconds>".
+    # memory:// keeps counters per process; redis://host:6379/0 shares them between workers
+    RATELIMIT_ENABLED = env_flag('RATELIMIT_ENABLED', 'true')
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
+    RATELIMIT_MEMORY_MAX_KEYS = int(os.environ.get('RATELIMIT_MEMORY_MAX_KEYS', 100000))
+    RATELIMIT_LOGIN_PER_IP = os.environ.get('RATELIMIT_LOGIN_PER_IP', '30/60')
+    RATELIMIT_LOGIN_PER_USERNAME = os.environ.get('RATELIMIT_LOGIN_PER_USERNAME', '10/300')
+    RATELIMIT_FORGOT_PASSWORD_PER_IP = os.environ.get('RATELIMIT_FORGOT_PASSWORD_PER_IP', '10/300')
+    RATELIMIT_FORGOT_PASSWORD_PER_EMAIL = os.environ.get('RATELIMIT_FORGOT_PASSWORD_PER_EMAIL', '3/3600')
+
+    # Per-process cache of role/is_active claims and token versions for authenticated callers.
+    # The process that changes a user drops their entry at once; other processes keep
+    # accepting tokens the change revoked until their entry expires, AUTH_CLAIMS_CACHE_TTL
+    # seconds at most. Disable the cache (one query per request) if that is too long.
+    AUTH_CLAIMS_CACHE_ENABLED = env_flag('AUTH_CLAIMS_CACHE_ENABLED', 'true')
+    AUTH_CLAIMS_CACHE_TTL = int(os.environ.get('AUTH_CLAIMS_CACHE_TTL', 30))  # seconds
+    AUTH_CLAIMS_CACHE_SIZE = int(os.environ.get('AUTH_CLAIMS_CACHE_SIZE', 10000))
     
     # Email configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
@@ -18,11 +125,35 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
 
+    # Outbound mail queue; MAIL_BACKEND is 'smtp', 'file' or 'memory'
+    MAIL_BACKEND = os.environ.get('MAIL_BACKEND', 'smtp')
+    MAIL_FILE_PATH = os.environ.get('MAIL_FILE_PATH', 'instance/mail')
+    MAIL_QUEUE_ENABLED = env_flag('MAIL_QUEUE_ENABLED', 'true')
+    MAIL_QUEUE_BATCH_SIZE = int(os.environ.get('MAIL_QUEUE_BATCH_SIZE', 50))
+    MAIL_QUEUE_POLL_INTERVAL = int(os.environ.get('MAIL_QUEUE_POLL_INTERVAL', 5))  # seconds
+    MAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('MAIL_QUEUE_MAX_ATTEMPTS', 5))
+    MAIL_QUEUE_RETRY_BACKOFF = int(os.environ.get('MAIL_QUEUE_RETRY_BACKOFF', 30))  # seconds, doubled per attempt
+
+    # Pagination
+    USERS_PAGE_DEFAULT_LIMIT = int(os.environ.get('USERS_PAGE_DEFAULT_LIMIT', 100))
+    USERS_PAGE_MAX_LIMIT = int(os.environ.get('USERS_PAGE_MAX_LIMIT', 1000))
+    USERS_STREAM_BATCH_SIZE = int(os.environ.get('USERS_STREAM_BATCH_SIZE', 500))
+    USERS_BATCH_MAX_IDS = int(os.environ.get('USERS_BATCH_MAX_IDS', 10000))
+
+    # User search: results per request, and how many matches are ranked before taking the top ones
+    USERS_SEARCH_DEFAULT_LIMIT = int(os.environ.get('USERS_SEARCH_DEFAULT_LIMIT', 20))
+    USERS_SEARCH_MAX_LIMIT = int(os.environ.get('USERS_SEARCH_MAX_LIMIT', 100))
+    USERS_SEARCH_CANDIDATES = int(os.environ.get('USERS_SEARCH_CANDIDATES', 1000))
+
 class DevelopmentConfig(Config):
     DEBUG = True
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=2, max_overflow=3)
 
 class ProductionConfig(Config):
     DEBUG = False
+    AUTO_CREATE_DATABASE = env_flag('AUTO_CREATE_DATABASE', 'false')
+    API_DOC_ENABLED = env_flag('API_DOC_ENABLED', 'false')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=10, max_overflow=10)
 
 config = {
     'development': DevelopmentConfig,
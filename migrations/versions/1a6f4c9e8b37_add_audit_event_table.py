@@ -0,0 +1,41 @@
+"""Add audit_event table
+
+Revision ID: 1a6f4c9e8b37
+Revises: e7d3b5a2c816
+Create Date: 2026-10-18 18:20:44.862190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a6f4c9e8b37'
+down_revision = 'e7d3b5a2c816'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('audit_event',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('action', sa.String(length=64), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=True),
+    sa.Column('target_id', sa.Integer(), nullable=True),
+    sa.Column('ip', sa.String(length=45), nullable=True),
+    sa.Column('details', sa.JSON(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_audit_event_actor_id_id', 'audit_event', ['actor_id', 'id'], unique=False)
+    op.create_index('ix_audit_event_target_id_id', 'audit_event', ['target_id', 'id'], unique=False)
+    op.create_index('ix_audit_event_action_id', 'audit_event', ['action', 'id'], unique=False)
+    op.create_index('ix_audit_event_created_at', 'audit_event', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_audit_event_created_at', table_name='audit_event')
+    op.drop_index('ix_audit_event_action_id', table_name='audit_event')
+    op.drop_index('ix_audit_event_target_id_id', table_name='audit_event')
+    op.drop_index('ix_audit_event_actor_id_id', table_name='audit_event')
+    op.drop_table('audit_event')
@@ -0,0 +1,26 @@
+"""Add token version to User model
+
+Revision ID: 3f1c2a7d9b04
+Revises: aee7519098c5
+Create Date: 2026-10-18 09:12:44.120318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9b04'
+down_revision = 'aee7519098c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
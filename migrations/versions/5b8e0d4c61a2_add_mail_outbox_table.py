@@ -0,0 +1,40 @@
+"""Add mail outbox table
+
+Revision ID: 5b8e0d4c61a2
+Revises: 3f1c2a7d9b04
+Create Date: 2026-10-18 10:03:27.518904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e0d4c61a2'
+down_revision = '3f1c2a7d9b04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('mail_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sender', sa.String(length=120), nullable=False),
+    sa.Column('recipient', sa.String(length=120), nullable=False),
+    sa.Column('subject', sa.String(length=255), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('status', sa.Enum('pending', 'sent', 'failed', name='mail_outbox_status'), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_mail_outbox_status_next_attempt_at', 'mail_outbox', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_mail_outbox_status_next_attempt_at', table_name='mail_outbox')
+    op.drop_table('mail_outbox')
+    sa.Enum(name='mail_outbox_status').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,33 @@
+"""Add revoked_token table
+
+Revision ID: 6d2b9f1e4a70
+Revises: 1a6f4c9e8b37
+Create Date: 2026-10-18 19:05:12.431876
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d2b9f1e4a70'
+down_revision = '1a6f4c9e8b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('revoked_token',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('jti')
+    )
+    op.create_index(op.f('ix_revoked_token_expires_at'), 'revoked_token', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_revoked_token_expires_at'), table_name='revoked_token')
+    op.drop_table('revoked_token')
@@ -0,0 +1,47 @@
+"""Move password reset tokens to a dedicated table
+
+Revision ID: 8d27e4f5a913
+Revises: 5b8e0d4c61a2
+Create Date: 2026-10-18 10:41:09.305126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d27e4f5a913'
+down_revision = '5b8e0d4c61a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('password_reset_token',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('token_hash', sa.String(length=64), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('token_hash')
+    )
+    op.create_index(op.f('ix_password_reset_token_user_id'), 'password_reset_token', ['user_id'], unique=False)
+    op.create_index(op.f('ix_password_reset_token_expires_at'), 'password_reset_token', ['expires_at'], unique=False)
+
+    # Outstanding raw tokens are not carried over; they expire within an hour anyway
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('password_reset_expiration')
+        batch_op.drop_column('password_reset_token')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('password_reset_token', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('password_reset_expiration', sa.DateTime(), nullable=True))
+        batch_op.create_unique_constraint(None, ['password_reset_token'])
+
+    op.drop_index(op.f('ix_password_reset_token_expires_at'), table_name='password_reset_token')
+    op.drop_index(op.f('ix_password_reset_token_user_id'), table_name='password_reset_token')
+    op.drop_table('password_reset_token')
@@ -0,0 +1,26 @@
+"""Add lower(username) index for case-insensitive search
+
+Revision ID: b2e86d1f5c39
+Revises: 6d2b9f1e4a70
+Create Date: 2026-10-18 21:14:03.208517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e86d1f5c39'
+down_revision = '6d2b9f1e4a70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Expression index for case-insensitive username prefix matching
+    pattern_ops = ' varchar_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else ''
+    op.create_index('ix_user_username_lower', 'user', [sa.text(f'lower(username){pattern_ops}')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_username_lower', table_name='user')
@@ -0,0 +1,38 @@
+"""Add indexes for user list filtering and sorting
+
+Revision ID: c4a91e7b2d58
+Revises: 8d27e4f5a913
+Create Date: 2026-10-18 17:31:52.114087
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a91e7b2d58'
+down_revision = '8d27e4f5a913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_role_id', ['role', 'id'], unique=False)
+        batch_op.create_index('ix_user_is_active_id', ['is_active', 'id'], unique=False)
+        batch_op.create_index('ix_user_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_user_username_pattern', ['username'], unique=False,
+                              postgresql_ops={'username': 'varchar_pattern_ops'})
+
+    # Expression index for case-insensitive email prefix matching
+    pattern_ops = ' varchar_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else ''
+    op.create_index('ix_user_email_lower', 'user', [sa.text(f'lower(email){pattern_ops}')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_email_lower', table_name='user')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_username_pattern')
+        batch_op.drop_index('ix_user_created_at_id')
+        batch_op.drop_index('ix_user_is_active_id')
+        batch_op.drop_index('ix_user_role_id')
@@ -0,0 +1,34 @@
+"""Add trigram index for user search
+
+Revision ID: e7d3b5a2c816
+Revises: c4a91e7b2d58
+Create Date: 2026-10-18 18:02:37.514903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7d3b5a2c816'
+down_revision = 'c4a91e7b2d58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Search falls back to LIKE scans on other databases
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_user_search_trgm', 'user',
+        [sa.text("lower(username || ' ' || email || ' ' || first_name || ' ' || last_name) gin_trgm_ops")],
+        unique=False, postgresql_using='gin'
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_user_search_trgm', table_name='user', postgresql_using='gin')
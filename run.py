@@ -1,13 +1,16 @@
+import sys
+import click
+from flask import current_app
 from flask.cli import FlaskGroup
-from app import create_app, db
-from app.models import User
+from app import create_app, db, mail_queue, setup_database
+from app.models import User, PasswordResetToken, RevokedToken
 
-app = create_app()
 cli = FlaskGroup(create_app=create_app)
 
-@app.shell_context_processor
-def make_shell_context():
-    return {'db': db, 'User': User}
+@cli.command("init_db")
+def init_db():
+    setup_database(current_app)
+    print("Database is ready.")
 
 @cli.command("create_admin")
 def create_admin():
@@ -30,5 +33,95 @@ def create_admin():
     db.session.commit()
     print(f"Admin user {username} created successfully.")
 
+@cli.command("send_mail")
+def send_mail():
+    sent = 0
+    while True:
+        batch = mail_queue.flush()
+        sent += batch
+        if batch < mail_queue.batch_size:
+            break
+    print(f"Processed {sent} queued message(s).")
+
+@cli.command("purge_reset_tokens")
+def purge_reset_tokens():
+    removed = PasswordResetToken.purge_expired()
+    print(f"Removed {removed} expired password reset token(s).")
+
+@cli.command("purge_revoked_tokens")
+def purge_revoked_tokens():
+    removed = RevokedToken.purge_expired()
+    print(f"Removed {removed} expired revoked token(s).")
+
+@cli.command("spec")
+@click.option('--output', '-o', default='-', help="File to write; '-' for stdout")
+def write_spec(output):
+    """Write swagger.json, e.g. at build time for API_SPEC_FILE."""
+    from app.api import api
+    from app.api.spec import build_spec
+    with current_app.test_request_context():
+        body = build_spec(api)
+    if output == '-':
+        sys.stdout.buffer.write(body + b'\n')
+    else:
+        with open(output, 'wb') as f:
+            f.write(body)
+        click.echo(f"Wrote {len(body)} bytes to {output}.", err=True)
+
+@cli.group("users")
+def users_cli():
+    """Bulk export and import of users."""
+
+def file_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+def report_progress(count, seconds):
+    click.echo(f"  {count} rows ({count / seconds:,.0f} rows/s)", err=True)
+
+@users_cli.command("export")
+@click.option('--output', '-o', default='-', help="File to write; '-' for stdout")
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults from the file extension, else csv')
+@click.option('--include-password-hash', is_flag=True, help='Include password hashes for a re-import elsewhere')
+@click.option('--batch-size', default=10000, show_default=True)
+def export_users_command(output, fmt, include_password_hash, batch_size):
+    from app.transfer import export_users
+    out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+    try:
+        count, seconds = export_users(out, file_format(output, fmt), include_password_hash, batch_size,
+                                      report=report_progress)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    click.echo(f"Exported {count} user(s) in {seconds:.1f}s.", err=True)
+
+@users_cli.command("import")
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults from the file extension, else csv')
+@click.option('--batch-size', default=10000, show_default=True)
+def import_users_command(path, fmt, batch_size):
+    """Import users from PATH ('-' for stdin).
+
+    Rows need username, email, first_name and last_name, plus password_hash
+    (stored as is) or password (hashed in parallel). role, is_active,
+    created_at and updated_at are optional. Existing usernames and emails
+    are skipped.
+    """
+    from app.transfer import import_users
+
+    def report_error(number, message):
+        click.echo(f"  row {number}: {message}", err=True)
+
+    stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    try:
+        inserted, skipped, invalid, seconds = import_users(stream, file_format(path, fmt), batch_size,
+                                                           report=report_progress, on_error=report_error)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+    click.echo(f"Imported {inserted} user(s), skipped {skipped} existing, {invalid} invalid, in {seconds:.1f}s.",
+               err=True)
+
 if __name__ == '__main__':
     cli()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import os
+import shutil
+
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-jwt-secret-with-at-least-32-bytes')
+os.environ.setdefault('MAIL_DEFAULT_SENDER', 'noreply@example.com')
+
+import pytest
+from config import Config
+from app import create_app, db
+from app.identity import claims_cache
+from app.models import User
+from app.routing import router
+
+PASSWORD = 'Passw0rd!'
+
+
+class TestConfig(Config):
+    TESTING = True
+    AUTO_CREATE_DATABASE = False
+    MAIL_BACKEND = 'memory'
+    MAIL_QUEUE_ENABLED = False
+    AUDIT_ENABLED = False
+    RATELIMIT_ENABLED = False
+    PASSWORD_HASH_WORKERS = 0
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    DB_REPLICA_STICKY_SECONDS = 60
+
+
+def seed_users(count=3):
+    """u0 is an Admin, the rest are Users; every password is PASSWORD."""
+    for i in range(count):
+        user = User(username=f'u{i}', email=f'u{i}@example.com', first_name='First', last_name='Last',
+                    role='Admin' if i == 0 else 'User', is_active=True)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+    db.session.commit()
+
+
+def make_app(config_class, tmp_path, replicas=0, **overrides):
+    primary = tmp_path / 'primary.db'
+    replica_paths = [tmp_path / f'replica_{i}.db' for i in range(replicas)]
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary}',
+        'SQLALCHEMY_BINDS': {f'replica_{i}': f'sqlite:///{path}' for i, path in enumerate(replica_paths)},
+        **overrides
+    }
+    app = create_app(type('Config', (config_class,), settings))
+    with app.app_context():
+        db.create_all(bind_key=None)
+        seed_users()
+        # Release file handles before the copies are taken
+        db.engine.dispose()
+    # The replicas start as exact copies of the primary
+    for path in replica_paths:
+        shutil.copyfile(primary, path)
+    return app
+
+
+@pytest.fixture(autouse=True)
+def reset_process_state():
+    yield
+    claims_cache.clear()
+    router._recent_writers.clear()
+
+
+@pytest.fixture
+def app(tmp_path):
+    return make_app(TestConfig, tmp_path)
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """A primary and one replica, as two SQLite files."""
+    return make_app(TestConfig, tmp_path, replicas=1)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, username='u0', password=PASSWORD):
+    response = client.post('/auth/login', json={'username': username, 'password': password})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import pytest
+from tests.conftest import login
+
+pytest.importorskip('a2wsgi')
+pytest.importorskip('aiosqlite')
+
+from app.asgi import create_asgi_app  # noqa: E402
+
+
+async def call(asgi, method, path, body=None, headers=None):
+    content = json.dumps(body).encode() if body is not None else b''
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': method, 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+        'headers': [(b'host', b'localhost'), (b'content-type', b'application/json'),
+                    (b'content-length', str(len(content)).encode())]
+                   + [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    received = False
+    messages = []
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {'type': 'http.request', 'body': content, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi(scope, receive, send)
+    start = next(m for m in messages if m['type'] == 'http.response.start')
+    headers = {name.decode().lower(): value.decode() for name, value in start['headers']}
+    body = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+    return start['status'], headers, json.loads(body) if body else None
+
+
+@pytest.fixture
+def asgi(app):
+    asgi = create_asgi_app(app, threads=2)
+    fallback = asgi.fallback
+    asgi.fallen_back = []
+
+    async def counting_fallback(scope, receive, send):
+        asgi.fallen_back.append(scope['path'])
+        await fallback(scope, receive, send)
+
+    asgi.fallback = counting_fallback
+    return asgi
+
+
+def test_login_and_user_reads_are_served_natively(app, asgi):
+    flask_user = app.test_client().get('/users/2', headers=login(app.test_client())).get_json()
+
+    async def scenario():
+        try:
+            status, _, tokens = await call(asgi, 'POST', '/auth/login', {'username': 'u0', 'password': 'Passw0rd!'})
+            assert status == 200 and set(tokens) == {'access_token', 'refresh_token'}
+            headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+
+            # The first request loads the blocklist through Flask; later ones stay native
+            await call(asgi, 'GET', '/users/2', headers=headers)
+            asgi.fallen_back.clear()
+            status, response_headers, user = await call(asgi, 'GET', '/users/2', headers=headers)
+            assert status == 200 and user == flask_user
+            cached = await call(asgi, 'GET', '/users/2', headers={**headers, 'If-None-Match': response_headers['etag']})
+            assert cached[0] == 304
+
+            status, _, body = await call(asgi, 'POST', '/auth/login', {'username': 'u0', 'password': 'wrong'})
+            assert (status, body) == (401, {'message': 'Invalid credentials'})
+            assert asgi.fallen_back == []
+        finally:
+            await asgi.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_other_cases_fall_back_to_flask(app, asgi):
+    async def scenario():
+        try:
+            status, _, body = await call(asgi, 'POST', '/auth/login', {'username': 'u0'})
+            assert status == 400 and 'password' in body['errors']
+
+            status, _, tokens = await call(asgi, 'POST', '/auth/login', {'username': 'u1', 'password': 'Passw0rd!'})
+            headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+            assert (await call(asgi, 'GET', '/users/1', headers=headers))[0] == 403
+            assert (await call(asgi, 'GET', '/users/2'))[0] == 401
+            assert (await call(asgi, 'GET', '/users/99', headers=login(app.test_client())))[0] == 404
+
+            assert (await call(asgi, 'POST', '/auth/logout', headers=headers))[0] == 200
+            assert (await call(asgi, 'GET', '/users/2', headers=headers))[0] == 401
+            assert '/auth/logout' in asgi.fallen_back
+        finally:
+            await asgi.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,22 @@
+from app import audit_log, db
+from app.models import AuditEvent
+from tests.conftest import TestConfig, make_app
+
+
+def test_full_buffer_drops_the_oldest_events_when_the_flush_fails(tmp_path, monkeypatch, caplog):
+    app = make_app(TestConfig, tmp_path, AUDIT_ENABLED=True, AUDIT_BATCH_SIZE=2, AUDIT_MAX_BUFFER=3)
+    monkeypatch.setattr(audit_log, 'ensure_started', lambda: None)
+    monkeypatch.setattr(audit_log, 'flush', lambda: 1 / 0)
+
+    for i in range(5):
+        audit_log.record('event', target_id=i)
+    assert [event['target_id'] for event in audit_log._buffer] == [2, 3, 4]
+    assert audit_log.dropped == 2
+
+    audit_log.report_dropped()
+    assert 'dropped 2 events' in caplog.text
+
+    monkeypatch.undo()
+    with app.app_context():
+        assert audit_log.flush_all() == 3
+        assert db.session.execute(db.select(db.func.count(AuditEvent.id))).scalar() == 3
@@ -0,0 +1,86 @@
+import time
+from datetime import datetime, timedelta
+from config import ProductionConfig
+from app import db
+from app.models import RevokedToken, User
+from app.revocation import token_blocklist
+from tests.conftest import PASSWORD, TestConfig, login, make_app
+
+
+class ProductionTestConfig(ProductionConfig):
+    # TESTING propagates exceptions like DEBUG does, hiding how restx handles them
+    TESTING = False
+    MAIL_BACKEND = TestConfig.MAIL_BACKEND
+    MAIL_QUEUE_ENABLED = False
+    AUDIT_ENABLED = False
+    RATELIMIT_ENABLED = False
+    PASSWORD_HASH_WORKERS = 0
+    PASSWORD_HASH_METHOD = TestConfig.PASSWORD_HASH_METHOD
+
+
+def test_revoked_refresh_token_is_rejected_in_production(tmp_path):
+    app = make_app(ProductionTestConfig, tmp_path)
+    assert not (app.debug or app.testing or app.config['PROPAGATE_EXCEPTIONS'])
+    client = app.test_client()
+    tokens = client.post('/auth/login', json={'username': 'u1', 'password': PASSWORD}).get_json()
+    refresh = {'Authorization': f"Bearer {tokens['refresh_token']}"}
+
+    assert client.post('/auth/refresh', headers=refresh).status_code == 200
+    assert client.post('/auth/logout', headers=refresh).status_code == 200
+
+    revoked = client.post('/auth/refresh', headers=refresh)
+    assert revoked.status_code == 401
+    assert revoked.get_json()['message'] == 'Token has been revoked'
+    assert client.get('/users/', headers={'Authorization': 'Bearer garbage'}).status_code == 422
+    assert client.post('/auth/refresh').status_code == 401
+
+
+def test_blocklist_does_not_cache_false_positives(app):
+    expires = time.time() + 600
+    with app.app_context():
+        token_blocklist.maybe_sync()
+        # A filter hit for a token nobody has revoked yet
+        token_blocklist._bloom.add('jti-1')
+        assert not token_blocklist.is_revoked('jti-1', expires)
+
+        # Another process revokes it
+        db.session.add(RevokedToken(jti='jti-1', expires_at=datetime.utcnow() + timedelta(minutes=10)))
+        db.session.commit()
+        assert token_blocklist.is_revoked('jti-1', expires)
+
+
+def test_purge_expired_revoked_tokens(app):
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.add_all([RevokedToken(jti='old', expires_at=now - timedelta(minutes=1)),
+                            RevokedToken(jti='new', expires_at=now + timedelta(minutes=1))])
+        db.session.commit()
+        assert RevokedToken.purge_expired(batch_size=1) == 1
+        assert db.session.execute(db.select(RevokedToken.jti)).scalars().all() == ['new']
+
+
+def test_logout_with_an_already_revoked_refresh_token(client):
+    first = client.post('/auth/login', json={'username': 'u1', 'password': PASSWORD}).get_json()
+    logout = {'refresh_token': first['refresh_token']}
+    assert client.post('/auth/logout', json=logout,
+                       headers={'Authorization': f"Bearer {first['access_token']}"}).status_code == 200
+
+    second = client.post('/auth/login', json={'username': 'u1', 'password': PASSWORD}).get_json()
+    access = {'Authorization': f"Bearer {second['access_token']}"}
+    assert client.post('/auth/logout', json=logout, headers=access).status_code == 200
+    assert client.get('/users/2', headers=access).status_code == 401
+
+
+def test_token_version_bumped_elsewhere_applies_within_the_cache_ttl(app, client, monkeypatch):
+    headers = login(client, 'u1')
+    assert client.get('/users/2', headers=headers).status_code == 200
+
+    # Another process revokes the user's tokens; this one still holds cached claims
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == 2).values(token_version=User.token_version + 1))
+        db.session.commit()
+    assert client.get('/users/2', headers=headers).status_code == 200
+
+    later = time.monotonic() + app.config['AUTH_CLAIMS_CACHE_TTL'] + 1
+    monkeypatch.setattr('app.identity.time.monotonic', lambda: later)
+    assert client.get('/users/2', headers=headers).status_code == 401
@@ -0,0 +1,44 @@
+import threading
+from werkzeug.security import generate_password_hash
+import app.hashing as hashing
+from app import db, hasher
+from app.models import User
+from tests.conftest import PASSWORD, TestConfig, make_app
+
+
+def test_single_hash_completes_while_a_batch_is_hashing(tmp_path):
+    make_app(TestConfig, tmp_path, PASSWORD_HASH_WORKERS=2, PASSWORD_HASH_MAX_PENDING=4, PASSWORD_HASH_TIMEOUT=2,
+             PASSWORD_HASH_METHOD='pbkdf2:sha256:100000')
+    try:
+        batch = []
+        thread = threading.Thread(target=lambda: batch.extend(hasher.hash_many(['Passw0rd!'] * 60)))
+        thread.start()
+        # Queued behind the whole batch, this would take longer than the timeout
+        assert hasher.verify(hasher.hash('Passw0rd!'), 'Passw0rd!')
+        thread.join()
+        assert len(batch) == 60 and hasher._slots._value == 4
+    finally:
+        hasher.shutdown()
+
+
+def test_login_rehashes_passwords_made_with_another_cost(app, client, monkeypatch):
+    with app.app_context():
+        db.session.get(User, 2).password_hash = generate_password_hash(PASSWORD, 'pbkdf2:sha256:500')
+        db.session.commit()
+
+    # Deciding whether to rehash must not run the KDF itself
+    hash_calls = []
+    monkeypatch.setattr(hashing, 'generate_password_hash',
+                        lambda *args: hash_calls.append(args) or generate_password_hash(*args))
+    assert hasher.needs_rehash(generate_password_hash(PASSWORD, 'pbkdf2:sha256:500'))
+    assert not hasher.needs_rehash(generate_password_hash(PASSWORD, TestConfig.PASSWORD_HASH_METHOD))
+    assert not hash_calls
+
+    assert client.post('/auth/login', json={'username': 'u1', 'password': PASSWORD}).status_code == 200
+    with app.app_context():
+        rehashed = db.session.get(User, 2).password_hash
+    assert rehashed.startswith('pbkdf2:sha256:1000$') and len(hash_calls) == 1
+
+    assert client.post('/auth/login', json={'username': 'u1', 'password': PASSWORD}).status_code == 200
+    with app.app_context():
+        assert db.session.get(User, 2).password_hash == rehashed
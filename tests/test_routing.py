@@ -0,0 +1,114 @@
+from flask_jwt_extended import verify_jwt_in_request
+from app import db
+from app.models import User
+from app.routing import read_only, router
+from tests.conftest import login
+
+
+def set_first_name(app, user_id, first_name, bind_key=None):
+    """Change a row in one database only, as replication lag would leave it."""
+    with app.app_context():
+        engine = db.engines[bind_key]
+        with engine.begin() as connection:
+            connection.execute(db.update(User).where(User.id == user_id).values(first_name=first_name))
+
+
+def test_read_only_requests_use_the_replica(replica_app):
+    client = replica_app.test_client()
+    headers = login(client)
+    set_first_name(replica_app, 2, 'Replica', 'replica_0')
+
+    assert client.get('/users/2', headers=headers).get_json()['first_name'] == 'Replica'
+
+
+def test_writes_use_the_primary(replica_app):
+    client = replica_app.test_client()
+    headers = login(client)
+    response = client.put('/users/2', headers=headers, json={
+        'username': 'u1', 'email': 'u1@example.com', 'first_name': 'Updated', 'last_name': 'Last',
+        'role': 'User', 'is_active': True
+    })
+    assert response.status_code == 200
+
+    with replica_app.app_context():
+        assert db.session.get(User, 2).first_name == 'Updated'
+        with db.engines['replica_0'].connect() as connection:
+            replica_name = connection.execute(db.select(User.first_name).where(User.id == 2)).scalar()
+    assert replica_name == 'First'
+
+
+def test_writer_reads_from_the_primary_after_a_write(replica_app):
+    client = replica_app.test_client()
+    admin = login(client)
+    user = login(client, 'u1')
+    client.put('/users/2', headers=user, json={
+        'username': 'u1', 'email': 'u1@example.com', 'first_name': 'Mine', 'last_name': 'Last',
+        'role': 'User', 'is_active': True
+    })
+
+    # The writer sees their change; other callers still read the lagging replica
+    assert client.get('/users/2', headers=user).get_json()['first_name'] == 'Mine'
+    assert client.get('/users/2', headers=admin).get_json()['first_name'] == 'First'
+
+
+def test_core_update_counts_as_a_write(replica_app):
+    @replica_app.route('/_test/bulk-rename', methods=['POST'])
+    def bulk_rename():
+        verify_jwt_in_request()
+        db.session.execute(db.update(User).where(User.id == 2).values(first_name='Bulk'))
+        db.session.commit()
+        return {}
+
+    @replica_app.route('/_test/first-name/<int:id>')
+    @read_only
+    def first_name(id):
+        verify_jwt_in_request()
+        return {'first_name': db.session.execute(db.select(User.first_name).where(User.id == id)).scalar()}
+
+    client = replica_app.test_client()
+    headers = login(client, 'u1')
+    assert client.post('/_test/bulk-rename', headers=headers).status_code == 200
+    assert client.get('/_test/first-name/2', headers=headers).get_json()['first_name'] == 'Bulk'
+
+    other = login(client, 'u2')
+    assert client.get('/_test/first-name/2', headers=other).get_json()['first_name'] == 'First'
+
+
+def test_without_replicas_reads_use_the_primary(app, client):
+    headers = login(client)
+    set_first_name(app, 2, 'Primary')
+    assert client.get('/users/2', headers=headers).get_json()['first_name'] == 'Primary'
+
+
+def test_batch_writer_reads_from_the_primary(replica_app):
+    client = replica_app.test_client()
+    admin = login(client)
+    response = client.post('/users/batch', headers=admin, json={'action': 'deactivate', 'ids': [2]})
+    assert response.get_json()['succeeded'] == 1
+
+    assert client.get('/users/2', headers=admin).get_json()['is_active'] is False
+
+
+def test_patch_writer_reads_from_the_primary(replica_app):
+    client = replica_app.test_client()
+    user = login(client, 'u1')
+    assert client.patch('/users/2', headers=user, json={'first_name': 'Patched'}).status_code == 200
+
+    assert client.get('/users/2', headers=user).get_json()['first_name'] == 'Patched'
+
+
+def test_sticky_cookie_carries_the_write_to_other_workers(replica_app):
+    client = replica_app.test_client()
+    user = login(client, 'u1')
+    client.patch('/users/2', headers=user, json={'first_name': 'Mine'})
+    cookie = client.get_cookie('db_sticky')
+    assert cookie is not None
+
+    # Another worker has not seen the write; only the cookie tells it
+    router._recent_writers.clear()
+    assert client.get('/users/2', headers=user).get_json()['first_name'] == 'Mine'
+
+    without_cookie = replica_app.test_client()
+    assert without_cookie.get('/users/2', headers=user).get_json()['first_name'] == 'First'
+    without_cookie.set_cookie('db_sticky', cookie.value + 'x')
+    assert without_cookie.get('/users/2', headers=user).get_json()['first_name'] == 'First'
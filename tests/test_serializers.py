@@ -0,0 +1,24 @@
+from datetime import datetime
+import pytest
+from flask import jsonify
+from app import serializers
+
+pytestmark = pytest.mark.skipif(serializers.orjson is None, reason='orjson is not installed')
+
+
+def test_jsonify_is_encoded_with_orjson(app, monkeypatch):
+    calls = []
+    dumps = serializers.orjson.dumps
+    monkeypatch.setattr(serializers.orjson, 'dumps', lambda *args, **kwargs: calls.append(args) or dumps(*args, **kwargs))
+
+    with app.test_request_context():
+        response = jsonify(name='u0', created=datetime(2024, 7, 5, 12, 0))
+
+    assert calls
+    assert response.get_json() == {'name': 'u0', 'created': 'Fri, 05 Jul 2024 12:00:00 GMT'}
+
+
+def test_jsonify_pretty_prints_in_debug(app):
+    app.debug = True
+    with app.test_request_context():
+        assert jsonify(a=1).get_data() == b'{\n  "a": 1\n}\n'
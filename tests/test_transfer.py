@@ -0,0 +1,27 @@
+import io
+from app import db
+from app.models import User
+from app.transfer import import_users
+
+
+def test_import_rejects_rows_that_registration_would(app):
+    csv = (
+        'username,email,first_name,last_name,password,role\n'
+        'new_user,new@example.com,New,User,Str0ng!Pass,User\n'
+        'bad name,bad@example.com,Bad,Name,Str0ng!Pass,User\n'
+        'weak,weak@example.com,Weak,Password,password,User\n'
+        'noemail,not-an-email,No,Email,Str0ng!Pass,User\n'
+        'boss,boss@example.com,Boss,Role,Str0ng!Pass,Boss\n'
+        'u1,u1@example.com,Existing,User,Str0ng!Pass,User\n'
+    )
+    rejected = {}
+    with app.app_context():
+        inserted, skipped, invalid, _ = import_users(io.BytesIO(csv.encode()), 'csv',
+                                                     on_error=lambda number, message: rejected.update({number: message}))
+        usernames = set(db.session.execute(db.select(User.username)).scalars())
+
+    assert (inserted, skipped, invalid) == (1, 1, 4)
+    assert sorted(rejected) == [2, 3, 4, 5]
+    assert 'Password must be' in rejected[3]
+    assert rejected[4] == 'Invalid email address'
+    assert 'new_user' in usernames and 'weak' not in usernames
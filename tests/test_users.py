@@ -0,0 +1,168 @@
+from types import SimpleNamespace
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.api.auth import duplicate_user_message
+from app.models import PasswordResetToken, User
+from app.pagination import encode_cursor
+from tests.conftest import TestConfig, login, make_app
+
+
+def capture_sql(app):
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda conn, cursor, sql, *args: statements.append(sql))
+    return statements
+
+
+def test_user_list_page_etag(app, client):
+    headers = login(client)
+    first = client.get('/users/?limit=2', headers=headers)
+    etag = first.headers['ETag']
+
+    statements = capture_sql(app)
+    cached = client.get('/users/?limit=2', headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert not any('count(' in sql.lower() or 'max(' in sql.lower() for sql in statements)
+
+    client.patch('/users/2', headers=headers, json={'first_name': 'Changed'})
+    changed = client.get('/users/?limit=2', headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()[1]['first_name'] == 'Changed'
+
+    # Rows beyond the page do not change its version
+    page = client.get('/users/?limit=1', headers=headers)
+    client.patch('/users/3', headers=headers, json={'first_name': 'Elsewhere'})
+    assert client.get('/users/?limit=1', headers={**headers, 'If-None-Match': page.headers['ETag']}).status_code == 304
+
+
+def test_batch_rejects_invalid_payloads(client):
+    headers = login(client)
+    response = client.post('/users/batch', headers=headers, json={'action': 'archive', 'ids': [2, 'x']})
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == {
+        'action': 'action must be one of promote, deactivate, activate, delete',
+        'ids': 'ids must be a list of integers'
+    }
+    assert client.post('/users/batch', headers=headers, json={'action': 'promote'}).status_code == 400
+
+
+def test_put_validates_the_payload(client):
+    headers = login(client)
+    user = {'username': 'u1', 'email': 'u1@example.com', 'first_name': 'First', 'last_name': 'Last',
+            'role': 'User', 'is_active': True}
+
+    missing = client.put('/users/2', headers=headers, json={k: v for k, v in user.items() if k != 'email'})
+    assert missing.status_code == 400
+    assert 'email' in missing.get_json()['errors']
+
+    invalid = client.put('/users/2', headers=headers, json={**user, 'email': 'nope', 'role': 'Boss'})
+    assert invalid.status_code == 400
+    assert set(invalid.get_json()['errors']) == {'email', 'role'}
+
+    taken = client.put('/users/2', headers=headers, json={**user, 'username': 'u2'})
+    assert taken.status_code == 409
+    assert taken.get_json()['message'] == 'Username already exists'
+    taken = client.put('/users/2', headers=headers, json={**user, 'email': 'u2@example.com'})
+    assert taken.status_code == 409
+    assert taken.get_json()['message'] == 'Email already exists'
+
+    assert client.put('/users/2', headers=headers, json={**user, 'first_name': ' Trimmed '}).get_json()['first_name'] == 'Trimmed'
+
+
+def test_duplicate_user_message_uses_the_violated_constraint(app):
+    # PostgreSQL's message quotes the values, so a username mentioning "email" must not matter
+    orig = Exception('duplicate key value violates unique constraint "user_username_key"\n'
+                     'DETAIL:  Key (username)=(email_fan) already exists.')
+    orig.diag = SimpleNamespace(constraint_name='user_username_key')
+    error = IntegrityError('UPDATE "user" ...', {}, orig)
+    with app.app_context():
+        assert duplicate_user_message('email_fan', 'fan@example.com', error) == 'Username already exists'
+        orig.diag.constraint_name = 'user_email_key'
+        assert duplicate_user_message('email_fan', 'fan@example.com', error) == 'Email already exists'
+
+
+def test_put_keeps_the_role_when_omitted(client):
+    profile = {'username': 'u1', 'email': 'u1@example.com', 'first_name': 'Own', 'last_name': 'Last',
+               'is_active': True}
+    own = client.put('/users/2', headers=login(client, 'u1'), json=profile)
+    assert own.status_code == 200
+    assert own.get_json()['role'] == 'User'
+
+    admin = login(client)
+    assert client.put('/users/2', headers=admin, json=profile).get_json()['role'] == 'User'
+    assert client.put('/users/2', headers=admin, json={**profile, 'role': 'Admin'}).get_json()['role'] == 'Admin'
+
+
+def test_search_ranks_prefix_matches_beyond_the_candidate_limit(tmp_path):
+    app = make_app(TestConfig, tmp_path, USERS_SEARCH_CANDIDATES=1)
+    with app.app_context():
+        for i in range(3):
+            db.session.add(User(username=f'a{i}', email=f'a{i}@example.com', first_name='Jimbob',
+                                last_name='Last', role='User', is_active=True, password_hash='-'))
+        db.session.add(User(username='bobsleigh_champion', email='champion@example.com', first_name='First',
+                            last_name='Last', role='User', is_active=True, password_hash='-'))
+        db.session.commit()
+    client = app.test_client()
+
+    found = client.get('/users/search?q=bob', headers=login(client)).get_json()
+    assert [user['username'] for user in found][0] == 'bobsleigh_champion'
+    assert len(found) == 2
+
+
+def test_search_matches_short_username_prefixes_in_any_case(tmp_path):
+    app = make_app(TestConfig, tmp_path)
+    with app.app_context():
+        db.session.add(User(username='Al', email='someone@example.com', first_name='First', last_name='Last',
+                            role='User', is_active=True, password_hash='-'))
+        db.session.commit()
+    client = app.test_client()
+
+    found = client.get('/users/search?q=al', headers=login(client)).get_json()
+    assert [user['username'] for user in found] == ['Al']
+
+
+def test_user_list_changes_after_a_delete(client):
+    headers = login(client)
+    first = client.get('/users/', headers=headers)
+    assert 'Last-Modified' not in first.headers
+
+    assert client.delete('/users/3', headers=headers).status_code == 200
+    for validator in ({'If-None-Match': first.headers['ETag']},
+                      {'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}):
+        after = client.get('/users/', headers={**headers, **validator})
+        assert after.status_code == 200
+        assert [user['username'] for user in after.get_json()] == ['u0', 'u1']
+
+
+def test_deleting_users_removes_their_reset_tokens(app, client):
+    with app.app_context():
+        tokens = [db.session.get(User, id).generate_reset_token() for id in (2, 3)]
+        db.session.commit()
+
+    headers = login(client)
+    assert client.delete('/users/2', headers=headers).status_code == 200
+    batch = client.post('/users/batch', headers=headers, json={'action': 'delete', 'ids': [3]})
+    assert batch.get_json()['succeeded'] == 1
+
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(PasswordResetToken.id))).scalar() == 0
+    for token in tokens:
+        reset = client.post('/auth/reset-password', json={'token': token, 'new_password': 'N3wPassw0rd!'})
+        assert reset.status_code == 400
+
+
+def test_tampered_cursors_are_rejected(client):
+    headers = login(client)
+    first = client.get('/users/?sort=created_at&limit=1', headers=headers)
+    assert client.get(f"/users/?sort=created_at&cursor={first.headers['X-Next-Cursor']}",
+                      headers=headers).status_code == 200
+
+    for sort, values in [('id', ['2']), ('id', [True]), ('id', [None]), ('id', [1, 2]),
+                         ('created_at', [1, 2]), ('created_at', ['yesterday', 2]),
+                         ('created_at', ['2024-01-01T00:00:00+00:00', 2]), ('created_at', ['2024-01-01', '2']),
+                         ('username', [1, 2])]:
+        response = client.get(f'/users/?sort={sort}&cursor={encode_cursor(values)}', headers=headers)
+        assert response.status_code == 400, (sort, values)
+        assert response.get_json()['message'] == 'Invalid cursor'
+    assert client.get('/audit/?cursor=' + encode_cursor(['5']), headers=headers).status_code == 400